@@ -1,5 +1,15 @@
 import gnome_station_analysis.functions
+import gnome_station_analysis.kernels
+import gnome_station_analysis.precision
 import gnome_station_analysis.fit
 import gnome_station_analysis.read
+import gnome_station_analysis.gap
+import gnome_station_analysis.psd
+import gnome_station_analysis.ddc
 import gnome_station_analysis.resonances
+import gnome_station_analysis.series
+import gnome_station_analysis.archive
+import gnome_station_analysis.batch
+import gnome_station_analysis.shared
+import gnome_station_analysis.results
 import gnome_station_analysis.tools.time
\ No newline at end of file
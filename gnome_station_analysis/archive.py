@@ -0,0 +1,193 @@
+import os
+import glob
+import numpy as np
+from collections import OrderedDict
+from . import read
+from . import series
+
+# packs all .dat files of the directory into single archive directory
+def pack(directory, archive_path, chunk_size = 64, start = np.array([0, 0, 0, 0])):
+    """Packs all measurement files of a given directory into a single archive
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of measurement files
+    archive_path : string
+        path of the created archive (directory)
+    chunk_size : int
+        number of measurements stored in one chunk file (optional)
+    start : array
+        [day, hh, mm, ss] - reference time for the times saved in the archive (optional)
+
+    Returns
+    -------
+    n : int
+        number of packed measurements
+
+    Notes
+    -----
+    The archive is a directory with chunk files (chunk_iiiii.npz) and the metadata table (index.npz)
+    holding file names, currents (see read.current()) and times from the start in hours (see tools.time.get_time_from_start()).
+    Every measurement is a separately compressed member of its chunk file, so reading one measurement decompresses only it.
+    Measurements are stored in the order of rising current. The index is written last, so an interrupted conversion
+    does not leave a readable archive. Previous content of archive_path (index and chunks) is removed first.
+
+    """
+    file_names, currents = read.all_names_currents(directory)
+    times = series.times_from_names(file_names, start = start)
+    os.makedirs(archive_path, exist_ok = True)
+    # old index goes first, so the archive is not readable while the chunks are replaced
+    index_path = os.path.join(archive_path, "index.npz")
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    for old_chunk in glob.glob(os.path.join(archive_path, "chunk_*.npz")):
+        os.remove(old_chunk)
+    chunks = np.zeros(len(file_names), dtype = int)
+    members = np.zeros(len(file_names), dtype = int)
+    lengths = np.zeros(len(file_names), dtype = int)
+    n_columns = 0
+    buffer = {}
+    for i, file_name in enumerate(file_names):
+        data = np.atleast_2d(np.loadtxt(file_name))
+        if n_columns == 0:
+            n_columns = data.shape[1]
+        if data.shape[1] != n_columns:
+            raise ValueError("File " + file_name + " has different number of columns than the previous files.")
+        chunks[i] = i//chunk_size
+        members[i] = i % chunk_size
+        lengths[i] = len(data)
+        buffer["e%d" % members[i]] = data
+        if len(buffer) == chunk_size or i == len(file_names) - 1:
+            np.savez_compressed(os.path.join(archive_path, "chunk_%05d.npz" % chunks[i]), **buffer)
+            buffer = {}
+    np.savez(index_path, file_names = np.array([os.path.basename(name) for name in file_names]),
+             currents = currents, times = times, chunks = chunks, members = members, lengths = lengths,
+             n_columns = n_columns, start = start)
+    return len(file_names)
+
+class archive:
+    """Reads measurements packed with archive.pack().
+
+    Parameters
+    ----------
+    path : string
+        path to the archive (directory)
+    cache_entries : int
+        number of decompressed measurements kept in memory (optional)
+
+    Notes
+    -----
+    Single measurement may be accessed by its index, file name, current or time. resonance and FID classes
+    may be created directly from the archive entry, for example resonances.resonance(17, archive = arch).
+
+    """
+
+    def __init__(self, path, cache_entries = 16):
+        """Reads metadata table of the archive.
+
+        Parameters
+        ----------
+        path : string
+            path to the archive (directory)
+        cache_entries : int
+            number of decompressed measurements kept in memory (optional)
+        """
+        self.path = path
+        with np.load(os.path.join(path, "index.npz")) as index:
+            self.file_names = index["file_names"]
+            self.currents = index["currents"]
+            self.times = index["times"]
+            self.chunks = index["chunks"]
+            self.members = index["members"]
+            self.lengths = index["lengths"]
+            self.start = index["start"]
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.file_names)
+
+    # returns decompressed measurement (least recently used measurements are removed from the cache)
+    def _entry(self, i):
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        # only the requested member of the chunk file is decompressed
+        with np.load(os.path.join(self.path, "chunk_%05d.npz" % self.chunks[i])) as data:
+            entry = data["e%d" % self.members[i]]
+        self._cache[i] = entry
+        if len(self._cache) > self.cache_entries:
+            self._cache.popitem(last = False)
+        return entry
+
+    def index(self, key):
+        """Finds index of the measurement.
+
+        Parameters
+        ----------
+        key : int or string
+            index or file name (with or without path) of the measurement
+
+        Returns
+        -------
+        i : int
+            index of the measurement in the archive
+        """
+        if isinstance(key, (int, np.integer)):
+            return int(key)
+        inds = np.flatnonzero(self.file_names == os.path.basename(key))
+        if len(inds) == 0:
+            raise KeyError("There is no " + str(key) + " in the archive.")
+        return int(inds[0])
+
+    def find_current(self, current):
+        """
+        Returns
+        -------
+        i : int
+            index of the measurement with current closest to the given value (in uA)
+        """
+        return int(np.nanargmin(np.abs(self.currents - current)))
+
+    def find_time(self, time):
+        """
+        Returns
+        -------
+        i : int
+            index of the measurement with time closest to the given value (in hours from the start)
+        """
+        return int(np.nanargmin(np.abs(self.times - time)))
+
+    def data(self, key):
+        """Reads all columns of the measurement.
+
+        Parameters
+        ----------
+        key : int or string
+            index or file name of the measurement
+
+        Returns
+        -------
+        data : 2-D array
+            the same as numpy.loadtxt() of the original file
+        """
+        return self._entry(self.index(key)).copy()
+
+    def file(self, key, *columns):
+        """Reads selected columns of the measurement (the same as read.file() for the original file).
+
+        Parameters
+        ----------
+        key : int or string
+            index or file name of the measurement
+        columns : int (multiple)
+            specifies which colums of data should be returned (beginning with 0!)
+
+        Returns
+        -------
+        (columns) : list of arrays
+            columns of data listed in parameters after key
+        """
+        data = self.data(key)
+        return [np.array(data[:, i]) for i in columns]
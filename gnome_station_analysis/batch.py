@@ -0,0 +1,218 @@
+import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from . import read
+from . import fit
+from . import shared
+
+# yields data of the files in the given order, next files are read in background threads
+def prefetch(file_names, columns = [0,1,2], depth = 4, threads = 2, loader = read.file):
+    """Iterates over files reading the next ones in background threads
+
+    Parameters
+    ----------
+    file_names : array of strings
+        table of file names
+    columns : list of ints
+        columns of data to read (optional)
+    depth : int
+        maximal number of files read ahead (optional) \n
+        memory used by the iterator is limited to depth files
+    threads : int
+        number of reading threads (optional)
+    loader : function
+        function called as loader(file_name, *columns) (optional, read.file() by default)
+
+    Yields
+    ------
+    file_name, data : string, list of arrays
+        file name and its columns (in the order of file_names)
+
+    Notes
+    -----
+    Reading (and parsing) the files overlaps with the work done by the caller on the previous file.
+    Errors of the loader are raised when the corresponding file is reached.
+
+    """
+    names = iter(file_names)
+    pool = ThreadPoolExecutor(max_workers = threads)
+    queue = deque()
+
+    def submit():
+        for file_name in names:
+            queue.append((file_name, pool.submit(loader, file_name, *columns)))
+            return
+
+    try:
+        for i in range(depth):
+            submit()
+        while queue:
+            file_name, future = queue.popleft()
+            submit()
+            yield file_name, future.result()
+    finally:
+        for file_name, future in queue:
+            future.cancel()
+        pool.shutdown(wait = True)
+
+# yields file name, current and data for all files in a directory (sorted by current)
+def iter_directory(directory, columns = [0,1,2], depth = 4, threads = 2):
+    """Iterates over all measurement files in a given directory reading the next ones in background threads
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of measurements
+    columns : list of ints
+        columns of data to read (optional)
+    depth : int
+        maximal number of files read ahead (optional)
+    threads : int
+        number of reading threads (optional)
+
+    Yields
+    ------
+    file_name, current, data : string, float, list of arrays
+        files in the order of rising current (see read.all_names_currents())
+
+    """
+    file_names, currents = read.all_names_currents(directory)
+    for current, (file_name, data) in zip(currents, prefetch(file_names, columns = columns, depth = depth, threads = threads)):
+        yield file_name, current, data
+
+# fits single spectrum (used by the batch functions, never raises fit errors)
+def fit_spectrum(freq, sig, linear_background = True, max_time = 5):
+    """Fits complex lorentzian to a single spectrum with fit.robust()
+
+    Parameters
+    ----------
+    freq : array
+        frequency scale in Hz
+    sig : complex array
+        complex lorentzian signal
+    linear_background : bool
+        when true complex lorentzian with linear background is fitted (optional)
+    max_time : float
+        maximal time in seconds spent on the fit (optional)
+
+    Returns
+    -------
+    popt, pcov : arrays
+        fit parameters and covariance matrix, np.nan when the fit failed \n
+        when linear background was dropped by fit.robust() its parameters are 0 and their errors are np.nan
+
+    """
+    popt, pcov, info = fit.robust(freq, sig, linear_background = linear_background, max_time = max_time)
+    if linear_background and not info["linear_background"]:
+        popt = np.concatenate([popt, np.zeros(4)])
+        full = np.full((8, 8), np.nan)
+        full[:4, :4] = pcov
+        pcov = full
+    return popt, pcov
+
+# fits spectrum placed in shared memory (worker side of fit_directory with transport = "shared")
+def _fit_shared(freq_desc, sig_desc, linear_background, max_time):
+    with shared.attach(freq_desc) as freq, shared.attach(sig_desc) as sig:
+        return fit_spectrum(freq.array, sig.array, linear_background, max_time)
+
+# reads columns of the file as frequency and complex signal (used by fit_directory)
+def _load_spectrum(file_name, *columns):
+    freq, X, Y = read.file(file_name, *columns)
+    return freq, X + 1j*Y
+
+# fits all spectra in the given files, reading of the files overlaps with fitting
+def fit_files(file_names, columns = [0,1,2], linear_background = True, max_time = 5, depth = 4, threads = 2, processes = 1, transport = "shared"):
+    """Fits complex lorentzian to all given measurement files
+
+    Parameters
+    ----------
+    file_names : array of strings
+        table of file names
+    columns : list of ints
+        columns with frequency, X and Y (optional)
+    linear_background : bool
+        when true complex lorentzian with linear background is fitted (optional)
+    max_time : float
+        maximal time in seconds spent on a single fit (optional)
+    depth : int
+        maximal number of files read ahead (optional)
+    threads : int
+        number of reading threads (optional)
+    processes : int
+        number of fitting processes (optional) \n
+        if processes = 1 fits are done in the main process, if None the number of CPUs is used
+    transport : string
+        "shared" - spectra are passed to the worker processes in shared memory (see shared.shared_arrays), \n
+        "pickle" - spectra are pickled for every task (optional)
+
+    Returns
+    -------
+    popt, pcov : arrays
+        fit parameters (one row per file, in the order of file_names) and covariance matrices
+
+    Notes
+    -----
+    Files are read in background threads (see prefetch()) while the previous spectra are fitted, so the total time
+    approaches the larger of the reading and the fitting time instead of their sum. Fits are done with fit_spectrum().
+
+    """
+    spectra = prefetch(file_names, columns = columns, depth = depth, threads = threads, loader = _load_spectrum)
+    if processes == 1:
+        results = [fit_spectrum(freq, sig, linear_background, max_time) for file_name, (freq, sig) in spectra]
+    else:
+        results = [None]*len(file_names)
+        workers = processes or os.cpu_count()
+        with ProcessPoolExecutor(max_workers = workers) as pool, shared.shared_arrays() as segments:
+            pending = {}
+
+            # segments are freed only after the worker finished (the task may not have started yet)
+            def collect(future):
+                i, descriptors = pending.pop(future)
+                try:
+                    results[i] = future.result()
+                finally:
+                    for descriptor in descriptors:
+                        segments.free(descriptor)
+
+            for i, (file_name, (freq, sig)) in enumerate(spectra):
+                if transport == "shared":
+                    descriptors = (segments.put(freq), segments.put(sig))
+                    future = pool.submit(_fit_shared, *descriptors, linear_background, max_time)
+                else:
+                    descriptors = ()
+                    future = pool.submit(fit_spectrum, freq, sig, linear_background, max_time)
+                pending[future] = (i, descriptors)
+                # number of spectra waiting for the workers is limited, so the memory is limited too
+                if len(pending) >= 2*workers:
+                    done, _ = wait(pending, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+            for future in list(pending):
+                collect(future)
+    n_params = 8 if linear_background else 4
+    popt = np.array([res[0] for res in results]).reshape(len(results), n_params)
+    pcov = np.array([res[1] for res in results]).reshape(len(results), n_params, n_params)
+    return popt, pcov
+
+# fits all spectra in a directory (sorted by current)
+def fit_directory(directory, columns = [0,1,2], linear_background = True, max_time = 5, depth = 4, threads = 2, processes = 1, transport = "shared"):
+    """Fits complex lorentzian to all measurements in a given directory
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of measurements
+    columns, linear_background, max_time, depth, threads, processes, transport :
+        see fit_files() (optional)
+
+    Returns
+    -------
+    file_names, currents, popt, pcov : arrays
+        file names and currents sorted by rising current, fit parameters (one row per file) and covariance matrices
+
+    """
+    file_names, currents = read.all_names_currents(directory)
+    popt, pcov = fit_files(file_names, columns = columns, linear_background = linear_background, max_time = max_time,
+                           depth = depth, threads = threads, processes = processes, transport = transport)
+    return file_names, currents, popt, pcov
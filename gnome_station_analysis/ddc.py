@@ -0,0 +1,203 @@
+import numpy as np
+from scipy import signal
+from numpy.lib.stride_tricks import sliding_window_view
+from . import kernels
+
+class downconverter:
+    """Streaming digital downconverter: mixing to baseband, low-pass filtering and decimation.
+
+    Parameters
+    ----------
+    fs : float
+        sampling frequency in Hz
+    f_c : float
+        centre frequency in Hz (mixed down to 0 Hz)
+    decimation : int
+        decimation factor
+    numtaps : int
+        length of FIR low-pass filter (optional, odd number) \n
+        if numtaps = 0, 8*decimation + 1 is used
+    cutoff : float
+        cutoff frequency of the filter in Hz (optional) \n
+        if cutoff = 0, 80% of the Nyquist frequency after decimation is used
+
+    Notes
+    -----
+    Data are given chunk by chunk with process method and flush method returns the last output samples.
+    The filter is evaluated only for the kept output samples (polyphase decimation). The filter is centred on the
+    output samples (no group delay), so output sample m corresponds to input sample m*decimation and
+    the phase of the mixing refers to the first input sample.
+
+    """
+
+    def __init__(self, fs, f_c, decimation, numtaps = 0, cutoff = 0):
+        """Creates downconverter.
+
+        Parameters
+        ----------
+        fs : float
+            sampling frequency in Hz
+        f_c : float
+            centre frequency in Hz
+        decimation : int
+            decimation factor
+        numtaps : int
+            length of FIR low-pass filter (optional)
+        cutoff : float
+            cutoff frequency of the filter in Hz (optional)
+        """
+        if numtaps == 0:
+            numtaps = 8*decimation + 1
+        if numtaps % 2 == 0:
+            numtaps += 1
+        if cutoff == 0:
+            cutoff = 0.8*fs/(2*decimation)
+        self.fs = fs
+        self.f_c = f_c
+        self.decimation = decimation
+        self.taps = signal.firwin(numtaps, cutoff, fs = fs)[::-1]
+        self.delay = (numtaps - 1)//2
+        self.n_in = 0
+        self.next_out = 0
+        self.buf = np.zeros(self.delay, dtype = complex)
+        self.buf_start = -self.delay
+
+    # computes outputs centred on input samples <= last
+    def _filter(self, last):
+        buf_end = self.buf_start + len(self.buf)
+        last = min(last, buf_end - 1 - self.delay)
+        if last < self.next_out:
+            return np.zeros(0, dtype = complex)
+        count = (last - self.next_out)//self.decimation + 1
+        first = self.next_out - self.delay - self.buf_start
+        windows = sliding_window_view(self.buf, len(self.taps))[first::self.decimation][:count]
+        out = windows @ self.taps
+        self.next_out += count*self.decimation
+        self.buf = self.buf[self.next_out - self.delay - self.buf_start:]
+        self.buf_start = self.next_out - self.delay
+        return out
+
+    def process(self, chunk):
+        """Processes the next chunk of the real signal.
+
+        Parameters
+        ----------
+        chunk : array
+            next samples of the signal
+
+        Returns
+        -------
+        baseband : complex array
+            new output samples (may be empty)
+        """
+        chunk = np.asarray(chunk)
+        n = self.n_in + np.arange(len(chunk))
+        mixed = chunk*np.exp(-2j*np.pi*self.f_c*n/self.fs)
+        self.buf = np.concatenate([self.buf, mixed])
+        self.n_in += len(chunk)
+        return self._filter(self.n_in - 1)
+
+    def flush(self):
+        """Returns the last output samples (the signal is padded with zeros after its end).
+
+        Returns
+        -------
+        baseband : complex array
+            remaining output samples
+        """
+        self.buf = np.concatenate([self.buf, np.zeros(self.delay, dtype = complex)])
+        return self._filter(self.n_in - 1)
+
+# centre frequency estimated from the beginning of the signal
+def auto_center(time, time_sig, length = 2**14):
+    """Estimates frequency of the strongest line in the signal
+
+    Parameters
+    ----------
+    time : array
+        time scale in s
+    time_sig : array of real floats
+        signal in time domain
+    length : int
+        number of first samples used for the estimate (optional)
+
+    Returns
+    -------
+    f_c : float
+        frequency of the largest FFT maximum (without 0 Hz) in Hz
+
+    """
+    part = time_sig[:length]
+    fft = np.abs(np.fft.rfft(part - np.mean(part)))
+    freq = np.fft.rfftfreq(len(part), time[1] - time[0])
+    return freq[np.argmax(fft[1:]) + 1]
+
+# mixes the whole signal to baseband and decimates it
+def downconvert(time, time_sig, f_c, decimation, numtaps = 0, cutoff = 0):
+    """Digital downconversion of the signal
+
+    Parameters
+    ----------
+    time : array
+        time scale in s
+    time_sig : array of real floats
+        signal in time domain
+    f_c : float
+        centre frequency in Hz
+    decimation : int
+        decimation factor
+    numtaps : int
+        length of FIR low-pass filter (optional)
+    cutoff : float
+        cutoff frequency of the filter in Hz (optional)
+
+    Returns
+    -------
+    time_dec, baseband : array, complex array
+        decimated time scale and complex baseband signal
+
+    Notes
+    -----
+    Please see downconverter class for details.
+
+    """
+    ddc = downconverter(1/(time[1] - time[0]), f_c, decimation, numtaps = numtaps, cutoff = cutoff)
+    baseband = np.concatenate([ddc.process(time_sig), ddc.flush()])
+    return time[::decimation][:len(baseband)], baseband
+
+# spectrum of the baseband signal with absolute frequency scale
+def comp_fft(time_dec, baseband, f_c, decimation, fmin = 0, fmax = 0):
+    """Computes FFT of the complex baseband signal
+
+    Parameters
+    ----------
+    time_dec : array
+        decimated time scale in s
+    baseband : complex array
+        complex baseband signal
+    f_c : float
+        centre frequency used in downconversion in Hz
+    decimation : int
+        decimation factor used in downconversion
+    fmin : float
+        minimal value of the returned frequency scale in Hz (optional)
+    fmax : float
+        maximal value of the frequency scale in Hz (optional) \n
+        if fmax = 0 the maximal value of freq scale is taken
+
+    Returns
+    -------
+    freq, sig : array of floats, array of complex floats
+        absolute frequency scale in Hz and complex signal in frequency domain
+
+    Notes
+    -----
+    The signal is multiplied by the decimation factor, so in the passband of the filter it equals read.comp_fft()
+    of the original signal (for the same length of the signal).
+
+    """
+    fft = np.fft.fftshift(np.fft.fft(baseband))*decimation
+    freq = f_c + np.fft.fftshift(np.fft.fftfreq(len(baseband), time_dec[1] - time_dec[0]))
+    if fmax == 0:
+        fmax = np.max(freq)
+    return kernels.band(freq, fft, fmin, fmax)
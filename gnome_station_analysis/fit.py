@@ -1,6 +1,11 @@
+import time
 import numpy as np
-from scipy.optimize import curve_fit
+from scipy.optimize import curve_fit, least_squares
+from scipy import signal, sparse, stats
+from concurrent.futures import ProcessPoolExecutor
 from . import functions as func
+from . import kernels
+from . import precision
 
 # params: freq scale and complex signal, returns guess initial params for the fit
 def guess_initial(freq, sig, phi = 0):
@@ -38,8 +43,105 @@ def guess_initial(freq, sig, phi = 0):
     p0 = [f0_guess, A_guess, gamma_guess, phi_guess]
     return p0
 
+# standard vector models evaluated in float32 in single precision mode: model -> (doubleside, linear background)
+_single_models = {func.vec_model: (False, False), func.vec_model_doubleside: (True, False),
+                  func.vec_model_lin_back: (False, True), func.vec_model_lin_back_doubleside: (True, True)}
+
+# uncertainty of the vector model points from the uncertainty of the complex points (the same for both parts)
+def _vector_sigma(sigma, size):
+    if sigma is None:
+        return None
+    return np.tile(np.broadcast_to(np.asarray(sigma, dtype = float), (size,)), 2)
+
+# curve_fit in double precision, in single precision mode models are evaluated in float32
+def precise_fit(model, freq, sig_vector, p0, sigma = None):
+    """Fitting vector model with precision selected by precision.set_precision().
+
+    Parameters
+    ----------
+    model : function
+        vector model (for example functions.vec_model)
+    freq : array
+        frequency scale in Hz
+    sig_vector : array
+        measured signal as [real part, imaginary part]
+    p0 : list
+        initial parameters
+    sigma : array
+        uncertainty of each element of sig_vector (optional) \n
+        only relative values matter, pcov is scaled by the residuals as in curve_fit with absolute_sigma = False
+
+    Returns
+    -------
+    popt, pcov : arrays
+        fit parameters and covariance matrix pcov (always float64)
+
+    Notes
+    -----
+    In double precision mode this is scipy.optimize.curve_fit(). In single precision mode the standard models
+    (vec_model, vec_model_doubleside, vec_model_lin_back, vec_model_lin_back_doubleside) and their analytic jacobians
+    are evaluated in float32 and passed to scipy.optimize.least_squares() (Levenberg-Marquardt, as in curve_fit).
+    The frequency scale and the parameters stay float64: the fit uses f0 and
+    the background measured from the centre of the frequency scale, the detunings f - f0 are computed in float64 and
+    only the lorentzian is evaluated in float32, so the resolution of f0 does not depend on the carrier frequency.
+    Covariance matrix is computed in float64 with fit.covariance(). Other models are fitted in double precision.
+
+    """
+    if precision.get_precision() == "double" or model not in _single_models:
+        return curve_fit(model, freq, sig_vector, p0 = p0, sigma = sigma, absolute_sigma = False)
+    doubleside, background = _single_models[model]
+    dtype = precision.real_dtype()
+    complex_dtype = precision.complex_dtype()
+    freq = np.asarray(freq, dtype = float)
+    sig_vector = np.asarray(sig_vector, dtype = dtype)
+    weights = np.ones(len(sig_vector), dtype = dtype) if sigma is None else (1/np.asarray(sigma, dtype = float)).astype(dtype)
+    centre = (np.max(freq) + np.min(freq))/2
+    offset = freq - centre
+    offset_single = offset.astype(dtype)
+    # params = M @ q + c, where q are the fitted parameters: f0 - centre and the background intercepts at the centre
+    M = np.eye(len(p0))
+    c = np.zeros(len(p0))
+    c[0] = centre
+    if background:
+        M[5, 4] = M[7, 6] = -centre
+
+    # complex lorentzian terms exp(i*phi)/(gamma + i*d) and derivatives of d over f0, d = f - f0 (and f + f0 for doubleside)
+    def units(q):
+        phase = np.complex128(np.exp(1j*q[3])).astype(complex_dtype)
+        detunings = [(offset - q[0], -1), (freq + centre + q[0], 1)] if doubleside else [(offset - q[0], -1)]
+        return phase, [(phase/(dtype(q[2]) + 1j*d.astype(dtype)), sign) for d, sign in detunings]
+
+    def residuals(q):
+        phase, terms = units(q)
+        sig = dtype(q[1])*sum(unit for unit, sign in terms)
+        if background:
+            sig = sig + np.complex128(q[4] + 1j*q[6]).astype(complex_dtype)*offset_single + np.complex128(q[5] + 1j*q[7]).astype(complex_dtype)
+        return (np.hstack([sig.real, sig.imag]) - sig_vector)*weights
+
+    def jac(q):
+        phase, terms = units(q)
+        A = dtype(q[1])
+        cols = np.zeros((len(freq), len(q)), dtype = complex_dtype)
+        for unit, sign in terms:
+            d_gamma = -A*unit*unit/phase
+            cols[:, 0] += sign*1j*d_gamma
+            cols[:, 1] += unit
+            cols[:, 2] += d_gamma
+            cols[:, 3] += 1j*A*unit
+        if background:
+            cols[:, 4] = offset_single
+            cols[:, 5] = 1
+            cols[:, 6] = 1j*offset_single
+            cols[:, 7] = 1j
+        return np.vstack([cols.real, cols.imag])*weights[:, None]
+
+    q0 = np.linalg.solve(M, np.asarray(p0, dtype = float) - c)
+    res = least_squares(residuals, q0, jac = jac, method = "lm")
+    pcov = covariance(res.jac, res.fun)
+    return M @ res.x + c, M @ pcov @ M.T
+
 # params: freq scale and complex signal, returns popt and pcov of the complex_lorentz function fit
-def complex_lorentz(freq, sig, p0 = [], phi = 0):
+def complex_lorentz(freq, sig, p0 = [], phi = 0, sigma = None):
     """Fitting functions.lorentz_functions() to the given data set.
 
     Parameters
@@ -52,6 +154,8 @@ def complex_lorentz(freq, sig, p0 = [], phi = 0):
         [f0, A, gamma, phi] - initial parameters
     phi : float
         initial guess for phase (optional)
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional, for example 1/np.sqrt(counts) from fit.crop())
 
     Returns
     -------
@@ -62,18 +166,21 @@ def complex_lorentz(freq, sig, p0 = [], phi = 0):
     -----
 
     Initial conditions are given by fit.guess_initial().
+    With "numba" backend (see kernels.set_backend()) the fit is done with fit.fused().
 
     To obtain the error of a chosen parameter popt[i] please use np.sqrt(pcov[i][i]).
 
     """
     if len(p0) == 0:
         p0 = guess_initial(freq, sig, phi)
+    if kernels.get_backend() == "numba":
+        return fused(freq, sig, p0, sigma = sigma)
     sig_vector = np.hstack([sig.real, sig.imag])
-    popt, pcov = curve_fit(func.vec_model, freq, sig_vector, p0 = p0)
+    popt, pcov = precise_fit(func.vec_model, freq, sig_vector, p0, sigma = _vector_sigma(sigma, len(freq)))
     return popt, pcov
 
 # params: freq scale and complex signal, returns popt and pcov of the complex_lorentz function fit
-def complex_lorentz_doubleside(freq, sig, p0 = [], phi = 0):
+def complex_lorentz_doubleside(freq, sig, p0 = [], phi = 0, sigma = None):
     """Fitting functions.lorentz_functions() to the given data set.
 
     Parameters
@@ -86,6 +193,8 @@ def complex_lorentz_doubleside(freq, sig, p0 = [], phi = 0):
         [f0, A, gamma, phi] - initial parameters
     phi : float
         initial guess for phase (optional)
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional, for example 1/np.sqrt(counts) from fit.crop())
 
     Returns
     -------
@@ -103,10 +212,10 @@ def complex_lorentz_doubleside(freq, sig, p0 = [], phi = 0):
     if len(p0) == 0:
         p0 = guess_initial(freq, sig, phi)
     sig_vector = np.hstack([sig.real, sig.imag])
-    popt, pcov = curve_fit(func.vec_model_doubleside, freq, sig_vector, p0 = p0)
+    popt, pcov = precise_fit(func.vec_model_doubleside, freq, sig_vector, p0, sigma = _vector_sigma(sigma, len(freq)))
     return popt, pcov
 
-def complex_lorentz_lin_back(freq, sig, p0 = [], phi = 0):
+def complex_lorentz_lin_back(freq, sig, p0 = [], phi = 0, sigma = None):
     """Fitting functions.complex_lorentz_lin_back() to the data set.
 
     Parameters
@@ -119,6 +228,8 @@ def complex_lorentz_lin_back(freq, sig, p0 = [], phi = 0):
         [f0, A, gamma, phi] - initial fit parameters
     phi : float
         initial guess for phase (optional)
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional, for example 1/np.sqrt(counts) from fit.crop())
 
     Returns
     -------
@@ -128,6 +239,7 @@ def complex_lorentz_lin_back(freq, sig, p0 = [], phi = 0):
     Notes
     -----
     Initial conditions are given by fit.guess_initial().
+    With "numba" backend (see kernels.set_backend()) the fit is done with fit.fused().
 
     To obtain the error of a chosen parameter popt[i] please use np.sqrt(pcov[i][i]).
 
@@ -135,11 +247,13 @@ def complex_lorentz_lin_back(freq, sig, p0 = [], phi = 0):
     if len(p0) == 0:
         p0 = guess_initial(freq, sig, phi)
     p0 = p0 + [0,0,0,0] # adding initial params for linear background
+    if kernels.get_backend() == "numba":
+        return fused(freq, sig, p0, sigma = sigma)
     sig_vector = np.hstack([sig.real, sig.imag])
-    popt, pcov = curve_fit(func.vec_model_lin_back, freq, sig_vector, p0 = p0)
+    popt, pcov = precise_fit(func.vec_model_lin_back, freq, sig_vector, p0, sigma = _vector_sigma(sigma, len(freq)))
     return popt, pcov
 
-def complex_lorentz_doubleside_lin_back(freq, sig, p0 = [], phi = 0):
+def complex_lorentz_doubleside_lin_back(freq, sig, p0 = [], phi = 0, sigma = None):
     """Fitting functions.complex_lorentz_lin_back() to the data set.
 
     Parameters
@@ -152,6 +266,8 @@ def complex_lorentz_doubleside_lin_back(freq, sig, p0 = [], phi = 0):
         [f0, A, gamma, phi] - initial fit parameters
     phi : float
         initial guess for phase (optional)
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional, for example 1/np.sqrt(counts) from fit.crop())
 
     Returns
     -------
@@ -169,5 +285,831 @@ def complex_lorentz_doubleside_lin_back(freq, sig, p0 = [], phi = 0):
         p0 = guess_initial(freq, sig, phi)
     p0 = p0 + [0,0,0,0] # adding initial params for linear background
     sig_vector = np.hstack([sig.real, sig.imag])
-    popt, pcov = curve_fit(func.vec_model_lin_back_doubleside, freq, sig_vector, p0 = p0)
+    popt, pcov = precise_fit(func.vec_model_lin_back_doubleside, freq, sig_vector, p0, sigma = _vector_sigma(sigma, len(freq)))
+    return popt, pcov
+
+# covariance matrix computed in the same way as in scipy.optimize.curve_fit
+def covariance(jac, residuals):
+    """Covariance matrix of the least squares fit parameters
+
+    Parameters
+    ----------
+    jac : array
+        jacobian of the residuals at the solution, shape (len(residuals), number of parameters)
+    residuals : array
+        residuals at the solution
+
+    Returns
+    -------
+    pcov : array
+        covariance matrix (scaled by the reduced chi square as in scipy.optimize.curve_fit)
+
+    """
+    jac = np.asarray(jac, dtype = float)
+    residuals = np.asarray(residuals, dtype = float)
+    _, s, VT = np.linalg.svd(jac, full_matrices = False)
+    threshold = np.finfo(float).eps*max(jac.shape)*s[0]
+    s = s[s > threshold]
+    VT = VT[:s.size]
+    pcov = np.dot(VT.T/s**2, VT)
+    dof = len(residuals) - jac.shape[1]
+    if dof > 0:
+        pcov = pcov*np.sum(residuals**2)/dof
+    else:
+        pcov.fill(np.inf)
+    return pcov
+
+# covariance matrix from sparse jacobian (normal matrix formed without dense jacobian)
+def sparse_covariance(jac, residuals):
+    """Covariance matrix of the least squares fit parameters for sparse jacobian
+
+    Parameters
+    ----------
+    jac : scipy.sparse matrix
+        jacobian of the residuals at the solution, shape (len(residuals), number of parameters)
+    residuals : array
+        residuals at the solution
+
+    Returns
+    -------
+    pcov : array
+        covariance matrix (scaled by the reduced chi square as in scipy.optimize.curve_fit)
+
+    Notes
+    -----
+    The normal matrix J^T J is formed as sparse product (only overlapping blocks of the jacobian contribute) and
+    inverted after scaling to unit diagonal, so the cost grows with the number of non-zero elements of the jacobian.
+
+    """
+    jac = sparse.csr_matrix(jac)
+    pcov = _scaled_pinv((jac.T @ jac).toarray())
+    dof = len(residuals) - jac.shape[1]
+    if dof > 0:
+        pcov = pcov*np.sum(np.asarray(residuals, dtype = float)**2)/dof
+    else:
+        pcov.fill(np.inf)
+    return pcov
+
+# params: freq scale and complex signal, returns indices and widths (in points) of the detected peaks
+def find_peaks(freq, sig, n_peaks = 0, prominence = 0.1):
+    """Detecting peaks in the absolute value of the complex signal.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex signal (from measurement)
+    n_peaks : int
+        number of peaks to return (optional) \n
+        if n_peaks = 0 all peaks with sufficient prominence are returned
+    prominence : float
+        minimal prominence of the peak as a fraction of the signal range (optional)
+
+    Returns
+    -------
+    peaks, widths : array of ints, array of floats
+        indices of the peaks (sorted by frequency) and their full widths at half maximum in points
+
+    Notes
+    -----
+    The method uses scipy.signal.find_peaks() and scipy.signal.peak_widths(). When n_peaks > 0 the most prominent peaks are taken.
+
+    """
+    R = np.abs(sig)
+    peaks, props = signal.find_peaks(R, prominence = prominence*(np.max(R) - np.min(R)))
+    order = np.argsort(props["prominences"])[::-1]
+    if n_peaks > 0:
+        order = order[:n_peaks]
+    peaks = np.sort(peaks[order])
+    widths = signal.peak_widths(R, peaks, rel_height = 0.5)[0]
+    return peaks, widths
+
+# params: freq scale and complex signal, returns guess initial params for the multi peak fit
+def guess_initial_multi(freq, sig, n_peaks = 0, prominence = 0.1):
+    """Guessing initial parameters for fitting sum of complex lorentzians to the given data set.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex signal (from measurement)
+    n_peaks : int
+        number of peaks (optional) \n
+        if n_peaks = 0 the number of peaks is given by find_peaks()
+    prominence : float
+        minimal prominence of the peak as a fraction of the signal range (optional)
+
+    Returns
+    -------
+    p0 : list
+        [f0_1, A_1, gamma_1, phi_1, ..., f0_K, A_K, gamma_K, phi_K] - initial parameters of the peaks (without background)
+
+    Notes
+    -----
+    The absolute value of complex lorentzian drops to half of its maximum at f0 +/- sqrt(3)*gamma and its maximum equals A/gamma,
+    so gamma and A are estimated from the width and the height of each peak. Phase is the angle of the signal at the peak.
+
+    """
+    peaks, widths = find_peaks(freq, sig, n_peaks = n_peaks, prominence = prominence)
+    df = np.abs(np.median(np.diff(freq)))
+    p0 = []
+    for peak, width in zip(peaks, widths):
+        gamma_guess = max(width, 1)*df/(2*np.sqrt(3))
+        p0 += [freq[peak], np.abs(sig[peak])*gamma_guess, gamma_guess, np.angle(sig[peak])]
+    return p0
+
+# block-sparse jacobian of the multi peak vector model
+def jac_multi(freq, params, window = 20):
+    """Jacobian of functions.vec_model_multi() with respect to its parameters
+
+    Parameters
+    ----------
+    freq : array
+        frequency scale in Hz (sorted)
+    params : array
+        parameters of functions.complex_lorentz_multi()
+    window : float
+        derivatives of each peak are computed only for |freq - f0| <= window*gamma (optional) \n
+        if window = np.inf the exact dense jacobian is returned (as sparse matrix)
+
+    Returns
+    -------
+    jac : scipy.sparse.csr_matrix
+        shape (2*len(freq), len(params))
+
+    Notes
+    -----
+    Each peak contributes a block of rows close to its resonant frequency, so the number of non-zero elements
+    grows with the number of points and not with the number of points times the number of peaks.
+
+    """
+    size = len(freq)
+    n_peaks = (len(params) - 4)//4
+    rows, cols, vals = [], [], []
+    for k in range(n_peaks):
+        f0, A, gamma, phi = params[4*k:4*k+4]
+        a = np.searchsorted(freq, f0 - window*np.abs(gamma))
+        b = np.searchsorted(freq, f0 + window*np.abs(gamma), side = "right")
+        inds = np.arange(a, b)
+        derivs = func.complex_lorentz_jac(freq[a:b], f0, A, gamma, phi)
+        for j in range(4):
+            rows += [inds, inds + size]
+            cols += [np.full(2*len(inds), 4*k + j)]
+            vals += [derivs[j].real, derivs[j].imag]
+    inds = np.arange(size)
+    back = 4*n_peaks
+    rows += [inds, inds, inds + size, inds + size]
+    cols += [np.full(size, back), np.full(size, back + 1), np.full(size, back + 2), np.full(size, back + 3)]
+    vals += [freq, np.ones(size), freq, np.ones(size)]
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    vals = np.concatenate(vals)
+    return sparse.csr_matrix((vals, (rows, cols)), shape = (2*size, len(params)))
+
+# params: freq scale and complex signal, returns popt and pcov of the sum of complex lorentzians fit
+def complex_lorentz_multi(freq, sig, n_peaks = 0, p0 = [], prominence = 0.1, window = 20):
+    """Fitting functions.complex_lorentz_multi() to the data set.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex signal (from measurement)
+    n_peaks : int
+        number of peaks (optional) \n
+        if n_peaks = 0 all peaks found by find_peaks() are fitted
+    p0 : list
+        [f0_1, A_1, gamma_1, phi_1, ..., f0_K, A_K, gamma_K, phi_K] - initial parameters of the peaks (optional)
+    prominence : float
+        minimal prominence of the peak as a fraction of the signal range (optional)
+    window : float
+        half width (in gamma) of the jacobian block of each peak (optional)
+
+    Returns
+    -------
+    popt, pcov : arrays
+        popt = [f0_1, A_1, gamma_1, phi_1, ..., f0_K, A_K, gamma_K, phi_K, a_real, b_real, a_imag, b_imag] and covariance matrix pcov
+
+    Notes
+    -----
+    Initial conditions are given by fit.guess_initial_multi().
+    The fit uses scipy.optimize.least_squares() with block-sparse jacobian (see jac_multi()), so the cost scales nearly linearly with the number of peaks.
+    The truncated jacobian moves the minimum, so the fit is finished with a few iterations with the exact jacobian (still sparse matrix).
+    Covariance matrix is computed with sparse_covariance() from the jacobian with blocks 10*window wide (the tails outside
+    the blocks carry about 2/(10*pi*window) of the information on A and phi, 0.3% with the default window).
+
+    To obtain the error of a chosen parameter popt[i] please use np.sqrt(pcov[i][i]).
+
+    """
+    freq = np.asarray(freq, dtype = float)
+    sig = np.asarray(sig)
+    order = np.argsort(freq, kind = "stable")
+    freq = freq[order]
+    sig = sig[order]
+    if len(p0) == 0:
+        p0 = guess_initial_multi(freq, sig, n_peaks = n_peaks, prominence = prominence)
+    p0 = list(p0) + [0,0,0,0] # adding initial params for linear background
+    sig_vector = np.hstack([sig.real, sig.imag])
+
+    def residuals(params):
+        return func.vec_model_multi(freq, *params) - sig_vector
+
+    def jac(params):
+        return jac_multi(freq, params, window = window)
+
+    def exact_jac(params):
+        return jac_multi(freq, params, window = np.inf)
+
+    res = least_squares(residuals, p0, jac = jac, method = "trf", tr_solver = "lsmr", x_scale = "jac")
+    # truncated jacobian moves the minimum (dispersive tails fall off as 1/(f - f0)), so the fit is finished with the exact one
+    res = least_squares(residuals, res.x, jac = exact_jac, method = "trf", tr_solver = "lsmr", x_scale = "jac", max_nfev = 20)
+    popt = res.x
+    pcov = sparse_covariance(jac_multi(freq, popt, window = 10*window), res.fun)
     return popt, pcov
+
+# inverse of symmetric positive semi-definite matrices (or stack of them) with the columns scaled to unit diagonal
+def _scaled_pinv(H):
+    d = np.sqrt(np.abs(np.diagonal(H, axis1 = -2, axis2 = -1)))
+    d[d == 0] = 1
+    outer = d[..., :, None]*d[..., None, :]
+    return np.linalg.pinv(H/outer, hermitian = True)/outer
+
+# params: freq scales, complex signals and currents of the sweep, returns global trends fitted to all files at once
+def joint(freqs, sigs, currents, f0_degree = 1, gamma_degree = 2, linear_background = True, p0 = []):
+    """Joint fit of complex lorentzians of a current sweep with f0 and gamma given by polynomials of the current.
+
+    Parameters
+    ----------
+    freqs : list of arrays
+        frequency scale in Hz of each file
+    sigs : list of complex arrays
+        complex signal of each file
+    currents : array like
+        coil current of each file
+    f0_degree : int
+        degree of the polynomial f0(I) (optional)
+    gamma_degree : int
+        degree of the polynomial gamma(I) (optional)
+    linear_background : bool
+        when true each file has its own complex linear background (optional)
+    p0 : list
+        [c_0, ..., c_f0_degree, g_0, ..., g_gamma_degree] - initial coefficients of f0(I) and gamma(I) (optional)
+
+    Returns
+    -------
+    popt, pcov, nuisance : array, array, 2-D array
+        popt = [c_0, ..., c_f0_degree, g_0, ..., g_gamma_degree], where f0 = c_0 + c_1*I + ... and gamma = g_0 + g_1*I + ..., \n
+        covariance matrix pcov of popt and per-file parameters nuisance - one row [A, phi] or [A, phi, a_real, b_real, a_imag, b_imag] per file
+
+    Notes
+    -----
+    All files are fitted in one scipy.optimize.least_squares() problem. Every file has its own amplitude, phase (and background),
+    so the jacobian has dense columns only for the polynomial coefficients and a small block per file for the rest.
+    It is passed as a sparse matrix (lsmr solver), so the cost grows nearly linearly with the number of files.
+    Initial coefficients are fitted to fit.estimate() of every file.
+
+    Covariance matrix of the coefficients is the inverse of the Schur complement of the per-file blocks
+    (per-file parameters are marginalised), scaled by the reduced chi square as in scipy.optimize.curve_fit.
+
+    """
+    n_files = len(freqs)
+    currents = np.asarray(currents, dtype = float)
+    if len(np.unique(currents)) <= max(f0_degree, gamma_degree):
+        raise ValueError("Joint fit requires more different currents than the degree of the polynomials.")
+    lengths = np.array([len(f) for f in freqs])
+    idx = np.repeat(np.arange(n_files), lengths)
+    freq = np.concatenate([np.asarray(f, dtype = float) for f in freqs])
+    sig = np.concatenate([np.asarray(s) for s in sigs])
+    sig_vector = np.hstack([sig.real, sig.imag])
+    size = len(freq)
+    n_f0 = f0_degree + 1
+    n_glob = n_f0 + gamma_degree + 1
+    n_nuis = 6 if linear_background else 2
+    n_params = n_glob + n_files*n_nuis
+    powers_f0 = currents[idx, None]**np.arange(n_f0)
+    powers_gamma = currents[idx, None]**np.arange(gamma_degree + 1)
+
+    guesses = np.array([_reguess(np.asarray(f, dtype = float), np.asarray(s)) for f, s in zip(freqs, sigs)])
+    if len(p0) == 0:
+        p0 = list(np.polynomial.polynomial.polyfit(currents, guesses[:, 0], f0_degree)) + \
+             list(np.polynomial.polynomial.polyfit(currents, guesses[:, 2], gamma_degree))
+    nuisance = np.zeros((n_files, n_nuis))
+    nuisance[:, 0] = guesses[:, 1]
+    nuisance[:, 1] = guesses[:, 3]
+    p0 = np.concatenate([np.asarray(p0, dtype = float), nuisance.ravel()])
+
+    # sparsity pattern: f0 and gamma coefficients + A and phi of the file (real and imaginary rows), background of the file
+    point = np.arange(size)
+    base = n_glob + idx*n_nuis
+    cols_lor = np.hstack([np.tile(np.arange(n_glob), (size, 1)), base[:, None], base[:, None] + 1])
+    rows = [np.repeat(point, n_glob + 2), np.repeat(point, n_glob + 2) + size]
+    cols = [cols_lor.ravel(), cols_lor.ravel()]
+    if linear_background:
+        rows += [point, point, point + size, point + size]
+        cols += [base + 2, base + 3, base + 4, base + 5]
+        back_vals = np.concatenate([freq, np.ones(size), freq, np.ones(size)])
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+
+    def unpack(params):
+        return powers_f0 @ params[:n_f0], powers_gamma @ params[n_f0:n_glob], params[n_glob:].reshape(n_files, n_nuis)[idx]
+
+    def residuals(params):
+        f0, gamma, nuis = unpack(params)
+        model = nuis[:, 0]*np.exp(1j*nuis[:, 1])/(gamma + 1j*(freq - f0))
+        if linear_background:
+            model = model + (nuis[:, 2] + 1j*nuis[:, 4])*freq + nuis[:, 3] + 1j*nuis[:, 5]
+        return np.hstack([model.real, model.imag]) - sig_vector
+
+    def jac(params):
+        f0, gamma, nuis = unpack(params)
+        derivs = func.complex_lorentz_jac(freq, f0, nuis[:, 0], gamma, nuis[:, 1])
+        vals_lor = np.hstack([derivs[0][:, None]*powers_f0, derivs[2][:, None]*powers_gamma, derivs[1][:, None], derivs[3][:, None]])
+        vals = [vals_lor.real.ravel(), vals_lor.imag.ravel()]
+        if linear_background:
+            vals.append(back_vals)
+        return sparse.csr_matrix((np.concatenate(vals), (rows, cols)), shape = (2*size, n_params))
+
+    res = least_squares(residuals, p0, jac = jac, method = "trf", tr_solver = "lsmr", x_scale = "jac")
+    popt = res.x
+
+    J = jac(popt).tocsc()
+    J_glob = J[:, :n_glob].toarray()
+    J_nuis = J[:, n_glob:]
+    H_nuis = (J_nuis.T @ J_nuis).tocoo()
+    blocks = np.zeros((n_files, n_nuis, n_nuis))
+    blocks[H_nuis.row//n_nuis, H_nuis.row % n_nuis, H_nuis.col % n_nuis] = H_nuis.data
+    H_cross = np.asarray(J_nuis.T @ J_glob).reshape(n_files, n_nuis, n_glob)
+    schur = J_glob.T @ J_glob - np.einsum("fag,fah->gh", H_cross, _scaled_pinv(blocks) @ H_cross)
+    pcov = _scaled_pinv(schur)
+    dof = 2*size - n_params
+    if dof > 0:
+        pcov = pcov*np.sum(res.fun**2)/dof
+    else:
+        pcov.fill(np.inf)
+    return popt[:n_glob], pcov, popt[n_glob:].reshape(n_files, n_nuis)
+
+# params: freq scale and complex signal, returns cheap estimate of f0 and gamma
+def estimate(freq, sig):
+    """Fast estimate of resonant frequency and width (without fitting).
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (sorted)
+    sig : complex array like
+        complex lorentzian signal (from measurement)
+
+    Returns
+    -------
+    f0, gamma : float, float
+        estimated resonant frequency and width in Hz
+
+    Notes
+    -----
+    f0 is the frequency of the maximum of the absolute value. The absolute value of complex lorentzian (above the median level)
+    drops to half of its maximum at f0 +/- sqrt(3)*gamma, so gamma is estimated from the width of the peak at half maximum.
+
+    """
+    freq = np.asarray(freq)
+    R = np.abs(sig)
+    peak = np.argmax(R)
+    base = np.median(R)
+    half = base + (R[peak] - base)/2
+    below_left = np.flatnonzero(R[:peak] < half)
+    below_right = np.flatnonzero(R[peak:] < half)
+    left = below_left[-1] if len(below_left) else 0
+    right = peak + below_right[0] if len(below_right) else len(R) - 1
+    df = np.abs(np.median(np.diff(freq)))
+    gamma = max(np.abs(freq[right] - freq[left]), df)/(2*np.sqrt(3))
+    return freq[peak], gamma
+
+# averages groups of n consecutive points
+def _bin(freq, sig, n):
+    starts = np.arange(0, len(freq), n)
+    counts = np.diff(np.r_[starts, len(freq)])
+    return np.add.reduceat(freq, starts)/counts, np.add.reduceat(sig, starts)/counts, counts
+
+# crops (and decimates wings of) the data set using the given crop description
+def apply_crop(freq, sig, crop):
+    """Cropping the data set to the window described by crop (see fit.crop()).
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (sorted)
+    sig : complex array like
+        complex signal
+    crop : dict
+        crop description returned by fit.crop()
+
+    Returns
+    -------
+    freq, sig, counts : array, complex array, array of ints
+        cropped data set, wings outside [core_min, core_max] are averaged in groups of crop["decimate"] points, \n
+        counts - number of original points averaged into each point
+
+    """
+    freq = np.asarray(freq)
+    sig = np.asarray(sig)
+    inds = (freq >= crop["f_min"]) * (freq <= crop["f_max"])
+    freq = freq[inds]
+    sig = sig[inds]
+    if crop["decimate"] <= 1:
+        return freq, sig, np.ones(len(freq), dtype = int)
+    left = freq < crop["core_min"]
+    right = freq > crop["core_max"]
+    core = ~(left + right)
+    freq_left, sig_left, counts_left = _bin(freq[left], sig[left], crop["decimate"])
+    freq_right, sig_right, counts_right = _bin(freq[right], sig[right], crop["decimate"])
+    counts = np.concatenate([counts_left, np.ones(np.count_nonzero(core), dtype = int), counts_right])
+    return np.concatenate([freq_left, freq[core], freq_right]), np.concatenate([sig_left, sig[core], sig_right]), counts
+
+# params: freq scale and complex signal, returns data set cropped around the resonance
+def crop(freq, sig, width = 10, core = 3, decimate = 1):
+    """Automatic cropping of the data set to the neighbourhood of the resonance.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (sorted)
+    sig : complex array like
+        complex lorentzian signal (from measurement)
+    width : float
+        half width of the window in units of gamma (optional)
+    core : float
+        half width (in units of gamma) of the central part that is never decimated (optional)
+    decimate : int
+        number of wing points averaged into one point (optional) \n
+        if decimate = 1 wings are not decimated
+
+    Returns
+    -------
+    freq, sig, counts, crop : array, complex array, array of ints, dict
+        cropped data set, number of original points in each point and
+        crop description {"f0", "gamma", "f_min", "f_max", "core_min", "core_max", "decimate"}
+
+    Notes
+    -----
+    f0 and gamma are estimated with fit.estimate(). The crop description may be saved and used again with fit.apply_crop()
+    (or the window may be passed as freq_min and freq_max to resonance class) to reproduce the fit.
+    Averaged wing points have smaller noise than the core points, pass sigma = 1/np.sqrt(counts) to the fit functions
+    (for example fit.complex_lorentz_lin_back()) to weight them accordingly.
+
+    """
+    f0, gamma = estimate(freq, sig)
+    crop = {"f0": f0, "gamma": gamma,
+            "f_min": f0 - width*gamma, "f_max": f0 + width*gamma,
+            "core_min": f0 - core*gamma, "core_max": f0 + core*gamma,
+            "decimate": int(decimate)}
+    freq, sig, counts = apply_crop(freq, sig, crop)
+    return freq, sig, counts, crop
+
+# complex model evaluated for many parameter sets at once, returns array of shape (len(params), 2*len(freq))
+def _batch_vec(model, freq, params):
+    sig = model(freq, *params.T[:, :, None])
+    return np.concatenate([sig.real, sig.imag], axis = -1)
+
+# batched Gauss-Newton refit of many data sets, warm started from popt
+def _batch_refit(model, freq, y, w, popt, n_iter):
+    eps = np.sqrt(np.finfo(float).eps)
+    popt = np.asarray(popt, dtype = float)
+    n_params = len(popt)
+    # jacobian of the nominal fit is used in all iterations and for all data sets (they differ from the nominal data only by noise)
+    m = _batch_vec(model, freq, popt[None, :])[0]
+    jac = np.empty((len(m), n_params))
+    for j in range(n_params):
+        shifted = popt.copy()
+        step = eps*max(1, abs(popt[j]))
+        shifted[j] += step
+        jac[:, j] = (_batch_vec(model, freq, shifted[None, :])[0] - m)/step
+    if w is None:
+        # single solve shared by all data sets, every iteration is one matrix product
+        jtj = jac.T @ jac
+        gain = np.linalg.solve(jtj + 1e-9*np.diag(np.diag(jtj)), jac.T)
+    else:
+        jtj = np.matmul(jac.T, w[:, :, None]*jac)
+        jtj = jtj + 1e-9*np.einsum("bpp->bp", jtj)[:, :, None]*np.eye(n_params)
+        gain = np.linalg.solve(jtj, (w[:, None, :]*jac.T))
+    params = np.tile(popt, (len(y), 1))
+    for it in range(n_iter):
+        r = y - (m if it == 0 else _batch_vec(model, freq, params))
+        if w is None:
+            params = params + r @ gain.T
+        else:
+            params = params + np.matmul(gain, r[:, :, None])[:, :, 0]
+    return params
+
+# single refit used by the process pool
+def _pool_refit(args):
+    model, freq, y, w, popt = args
+    good = w > 0
+    x = np.hstack([freq, freq])
+
+    def vec(x_good, *params):
+        sig = model(freq, *params)
+        return np.hstack([sig.real, sig.imag])[good]
+
+    try:
+        params, _ = curve_fit(vec, x[good], y[good], p0 = popt)
+    except RuntimeError:
+        params = np.full(len(popt), np.nan)
+    return params
+
+# params: complex model, data set and nominal fit, returns bootstrap (or jackknife) parameter samples and confidence intervals
+def bootstrap(model, freq, sig, popt, n_boot = 200, method = "residual", level = 0.6827, n_blocks = 20, contiguous = False, n_iter = 3, processes = None, seed = None):
+    """Bootstrap or jackknife estimation of the fit parameters uncertainty.
+
+    Parameters
+    ----------
+    model : function
+        complex model used in the fit (for example functions.complex_lorentz_lin_back)
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex signal (from measurement)
+    popt : array
+        parameters of the nominal fit
+    n_boot : int
+        number of bootstrap data sets (optional)
+    method : string
+        "residual" - residuals of the nominal fit are resampled with replacement, \n
+        "jackknife" - each of n_blocks groups of points is left out once (optional)
+    level : float
+        confidence level of the returned intervals (optional, default is one sigma)
+    n_blocks : int
+        number of groups for jackknife method (optional)
+    contiguous : bool
+        if true jackknife groups are contiguous frequency blocks, otherwise every n_blocks-th point belongs to the same group (optional) \n
+        contiguous blocks are meant for noise correlated between neighbouring points, with white noise they overestimate the errors
+    n_iter : int
+        number of Gauss-Newton iterations of the batched refit (optional)
+    processes : int
+        if given, data sets are refitted with curve_fit in a process pool instead of the batched solver (optional)
+    seed : int
+        seed of the random number generator (optional)
+
+    Returns
+    -------
+    samples, ci : arrays
+        refitted parameters (one row per data set) and confidence intervals ci[0] (lower bounds), ci[1] (upper bounds)
+
+    Notes
+    -----
+    All resampled data sets are kept in a single 2-D array. The batched solver refits all of them at once with a few
+    Gauss-Newton iterations warm started from popt. All iterations use the jacobian of the nominal fit, so the linear solve is done once
+    and every iteration of all residual bootstrap data sets is a single matrix product.
+    For bootstrap the intervals are percentiles of the samples, for jackknife they are popt +/- z*(jackknife standard error).
+
+    """
+    freq = np.asarray(freq, dtype = float)
+    sig = np.asarray(sig)
+    popt = np.asarray(popt, dtype = float)
+    size = len(freq)
+    fitted = model(freq, *popt)
+    if method == "residual":
+        rng = np.random.default_rng(seed)
+        resid = sig - fitted
+        inds = rng.integers(0, size, (n_boot, size))
+        resampled = fitted + resid[inds]
+        y = np.concatenate([resampled.real, resampled.imag], axis = 1)
+        w = None
+    elif method == "jackknife":
+        if contiguous:
+            blocks = np.arange(size)*n_blocks//size
+        else:
+            blocks = np.arange(size) % n_blocks
+        y = np.tile(np.hstack([sig.real, sig.imag]), (n_blocks, 1))
+        w = np.tile(np.hstack([blocks, blocks]), (n_blocks, 1)) != np.arange(n_blocks)[:, None]
+        w = w.astype(float)
+    else:
+        raise ValueError("Unknown method: " + str(method))
+
+    if processes is None:
+        chunk = max(1, int(2e7/(2*size*len(popt))))
+        samples = np.vstack([_batch_refit(model, freq, y[i:i+chunk], None if w is None else w[i:i+chunk], popt, n_iter) for i in range(0, len(y), chunk)])
+    else:
+        if w is None:
+            w = np.ones_like(y)
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            samples = np.array(list(pool.map(_pool_refit, [(model, freq, y[i], w[i], popt) for i in range(len(y))])))
+
+    if method == "residual":
+        ci = np.nanpercentile(samples, [50*(1 - level), 50*(1 + level)], axis = 0)
+    else:
+        n = len(samples)
+        err = np.sqrt((n - 1)/n*np.nansum((samples - np.nanmean(samples, axis = 0))**2, axis = 0))
+        z = stats.norm.ppf(0.5 + level/2)
+        ci = np.array([popt - z*err, popt + z*err])
+    return samples, ci
+
+# fit with residuals and analytic jacobian computed by a single kernel call
+def fused(freq, sig, p0, sigma = None):
+    """Fitting complex lorentzian (with linear background when len(p0) = 8) using fused residual and jacobian kernel.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex lorentzian signal (from measurement)
+    p0 : list
+        [f0, A, gamma, phi] or [f0, A, gamma, phi, a_real, b_real, a_imag, b_imag] - initial parameters
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional)
+
+    Returns
+    -------
+    popt, pcov : arrays
+        fit parameters and covariance matrix pcov
+
+    Notes
+    -----
+    The fit uses scipy.optimize.least_squares() (Levenberg-Marquardt, the same algorithm as curve_fit) with kernels.residual_jac().
+
+    """
+    freq = np.asarray(freq, dtype = float)
+    sig_vector = np.hstack([sig.real, sig.imag])
+    weights = 1/_vector_sigma(1 if sigma is None else sigma, len(freq))
+    cache = {}
+
+    def evaluate(params):
+        key = params.tobytes()
+        if cache.get("key") != key:
+            cache["key"] = key
+            res, jac = kernels.residual_jac(freq, sig_vector, params)
+            cache["res"], cache["jac"] = res*weights, jac*weights[:, None]
+        return cache
+
+    res = least_squares(lambda params: evaluate(params)["res"], np.asarray(p0, dtype = float), jac = lambda params: evaluate(params)["jac"], method = "lm")
+    return res.x, covariance(res.jac, res.fun)
+
+# raised by _monitor to stop hopeless fit
+class _abort(Exception):
+    pass
+
+# residual function watching the progress of the fit
+class _monitor:
+    def __init__(self, fun, deadline, freq, stall, max_negative):
+        self.fun = fun
+        self.deadline = deadline
+        self.centre = (np.max(freq) + np.min(freq))/2
+        self.span = np.max(freq) - np.min(freq)
+        self.stall = stall
+        self.nfev = 0
+        self.best = np.inf
+        self.best_nfev = 0
+        self.best_params = None
+        self.negative = 0
+        self.max_negative = max_negative
+
+    def __call__(self, params):
+        self.nfev += 1
+        if time.monotonic() > self.deadline:
+            raise _abort("time limit")
+        if not np.all(np.isfinite(params)) or np.abs(params[0] - self.centre) > 10*self.span or np.abs(params[2]) > 10*self.span:
+            raise _abort("parameters blow-up")
+        res = self.fun(params)
+        cost = np.sum(res**2)
+        if not np.isfinite(cost):
+            raise _abort("non-finite residuals")
+        if cost < self.best*(1 - 1e-10):
+            # accepted step of the solver (finite difference jacobian evaluations change only one parameter),
+            # the fit may cross gamma = 0 and come back, it is stopped when it stays there for many steps
+            if self.best_params is None or np.count_nonzero(params != self.best_params) > 1:
+                self.negative = self.negative + 1 if params[2] < 0 else 0
+                if self.negative > self.max_negative:
+                    raise _abort("negative gamma")
+            self.best = cost
+            self.best_nfev = self.nfev
+            self.best_params = np.array(params)
+        elif self.nfev - self.best_nfev > self.stall:
+            raise _abort("no cost reduction")
+        return res
+
+# initial parameters from fit.estimate() and the signal at the peak
+def _reguess(freq, sig):
+    f0, gamma = estimate(freq, sig)
+    peak = np.argmin(np.abs(freq - f0))
+    return [f0, np.abs(sig[peak])*gamma, gamma, np.angle(sig[peak])]
+
+# params: freq scale and complex signal, returns popt, pcov and description of the successful strategy
+def robust(freq, sig, p0 = [], linear_background = True, max_time = 5, max_nfev = 1000, strategies = ["default", "reguess", "bounded", "crop", "no_background"], sigma = None):
+    """Fitting complex lorentzian with early failure detection and escalating retry strategies.
+
+    Parameters
+    ----------
+    freq : array like
+        frequency scale in Hz (from measurement)
+    sig : complex array like
+        complex lorentzian signal (from measurement)
+    p0 : list
+        [f0, A, gamma, phi] - initial parameters (optional)
+    linear_background : bool
+        when true functions.vec_model_lin_back() is fitted, when false - functions.vec_model() (optional)
+    max_time : float
+        maximal time in seconds spent on all strategies (optional)
+    max_nfev : int
+        maximal number of function evaluations of a single strategy (optional)
+    strategies : list of strings
+        strategies tried in the given order (optional): \n
+        "default" - p0 (or fit.guess_initial()), unbounded Levenberg-Marquardt, \n
+        "reguess" - initial parameters from fit.estimate(), unbounded Levenberg-Marquardt, \n
+        "bounded" - as "reguess" with trust region reflective method, f0 within the data and gamma > 0, \n
+        "crop" - as "bounded" on the data cropped with fit.crop(), \n
+        "no_background" - as "crop" without linear background
+    sigma : array like
+        uncertainty of each point, only relative values matter (optional) \n
+        points averaged by the "crop" strategy get the uncertainty of their mean
+
+    Returns
+    -------
+    popt, pcov, info : array, array, dict
+        fit parameters (see fit.complex_lorentz() and fit.complex_lorentz_lin_back()), covariance matrix and
+        info = {"strategy", "linear_background", "crop", "attempts", "nfev", "time"}
+
+    Notes
+    -----
+    Every strategy is stopped early when the time limit is exceeded, the parameters become non-finite or run far outside
+    the data, gamma stays negative for many solver steps or the cost is not reduced for many evaluations. Solutions with
+    the resonance narrower than the frequency step or amplitude A smaller than 3 errors are rejected. The reasons of the failed attempts
+    are listed in info["attempts"]. When all strategies fail popt and pcov are filled with np.nan and info["strategy"] is None,
+    so a single hopeless spectrum never stops a batch analysis.
+
+    """
+    freq = np.asarray(freq, dtype = float)
+    sig = np.asarray(sig)
+    start = time.monotonic()
+    deadline = start + max_time
+    step = np.median(np.abs(np.diff(freq)))
+    variance = np.ones(len(freq)) if sigma is None else np.broadcast_to(np.asarray(sigma, dtype = float)**2, (len(freq),))
+    info = {"strategy": None, "linear_background": linear_background, "crop": None, "attempts": [], "nfev": 0, "time": 0}
+    for strategy in strategies:
+        freq_s, sig_s, variance_s = freq, sig, variance
+        background = linear_background and strategy != "no_background"
+        bounded = strategy in ("bounded", "crop", "no_background")
+        crop_s = None
+        try:
+            if strategy == "default":
+                p_start = list(p0) if len(p0) else guess_initial(freq, sig)
+            else:
+                if strategy in ("crop", "no_background"):
+                    freq_s, sig_s, counts, crop_s = crop(freq, sig)
+                    # variance of the mean of the averaged points
+                    variance_s = apply_crop(freq, variance, crop_s)[1]/counts
+                p_start = _reguess(freq_s, sig_s)
+        except (ValueError, IndexError) as err:
+            info["attempts"].append((strategy, str(err)))
+            continue
+        model = func.vec_model_lin_back if background else func.vec_model
+        if background:
+            p_start = p_start + [0,0,0,0]
+        sig_vector = np.hstack([sig_s.real, sig_s.imag])
+        weights = 1/_vector_sigma(np.sqrt(variance_s), len(freq_s))
+        n_params = len(p_start)
+        monitor = _monitor(lambda params: (model(freq_s, *params) - sig_vector)*weights, deadline, freq_s, stall = 20*(n_params + 1), max_negative = 20*n_params)
+        if bounded:
+            lower = np.full(n_params, -np.inf)
+            upper = np.full(n_params, np.inf)
+            lower[0], upper[0] = np.min(freq_s), np.max(freq_s)
+            lower[2], upper[2] = 0, np.max(freq_s) - np.min(freq_s)
+            p_start = np.array(p_start, dtype = float)
+            p_start[0] = np.clip(p_start[0], lower[0], upper[0])
+            p_start[2] = np.clip(p_start[2], 1e-6*upper[2], upper[2])
+            kwargs = {"method": "trf", "bounds": (lower, upper), "x_scale": "jac"}
+        else:
+            kwargs = {"method": "lm"}
+        try:
+            res = least_squares(monitor, p_start, max_nfev = max_nfev, **kwargs)
+        except _abort as err:
+            info["nfev"] += monitor.nfev
+            info["attempts"].append((strategy, str(err)))
+            continue
+        info["nfev"] += monitor.nfev
+        if res.status <= 0:
+            info["attempts"].append((strategy, "evaluation budget exceeded"))
+            continue
+        pcov = covariance(res.jac, res.fun)
+        if not np.all(np.isfinite(pcov)) or res.x[2] <= 0:
+            info["attempts"].append((strategy, "invalid solution"))
+            continue
+        # resonance (full width 2*sqrt(3)*gamma, see estimate()) narrower than the frequency step
+        # or amplitude consistent with zero (for example pure noise)
+        if 2*np.sqrt(3)*res.x[2] < step:
+            info["attempts"].append((strategy, "gamma below frequency step"))
+            continue
+        if np.abs(res.x[1]) < 3*np.sqrt(pcov[1][1]):
+            info["attempts"].append((strategy, "no significant resonance"))
+            continue
+        info["attempts"].append((strategy, "success"))
+        info["strategy"] = strategy
+        info["linear_background"] = background
+        info["crop"] = crop_s
+        info["time"] = time.monotonic() - start
+        return res.x, pcov, info
+    n_params = 8 if linear_background else 4
+    info["time"] = time.monotonic() - start
+    return np.full(n_params, np.nan), np.full((n_params, n_params), np.nan), info
@@ -238,9 +238,9 @@ def vec_model_lin_back(freq, f0, A, gamma, phi, a_real, b_real, a_imag, b_imag):
     imag_part = np.imag(complex_lorentz(freq, f0, A, gamma, phi)) + a_imag * freq + b_imag
     return np.hstack([real_part, imag_part])
 
-# vector model for complex_lorentz_lin_back
-def vec_model_lin_back(freq, f0, A, gamma, phi, a_real, b_real, a_imag, b_imag):
-    """Vector model for complex lorentzian function with complex linear background (complex_lorentz_lin_back)
+# vector model for complex_lorentz_doubleside_lin_back
+def vec_model_lin_back_doubleside(freq, f0, A, gamma, phi, a_real, b_real, a_imag, b_imag):
+    """Vector model for sum of complex lorentzians with complex linear background (complex_lorentz_doubleside_lin_back)
 
     Parameters
     ----------
@@ -273,3 +273,90 @@ def vec_model_lin_back(freq, f0, A, gamma, phi, a_real, b_real, a_imag, b_imag):
     imag_part = np.imag(complex_lorentz_doubleside(freq, f0, A, gamma, phi)) + a_imag * freq + b_imag
     return np.hstack([real_part, imag_part])
 
+
+# derivatives of complex_lorentz with respect to f0, A, gamma and phi
+def complex_lorentz_jac(f, f0, A, gamma, phi):
+    """Derivatives of complex lorentzian function (complex_lorentz) with respect to its parameters
+
+    Parameters
+    ----------
+    f : float or array_like
+        frequency
+    f0 : float
+        resonant frequency
+    A : float
+        scaling factor
+    gamma : float
+        :math:`\gamma` -- full width at half maximum (FWHM)
+    phi : float
+        :math:`\phi` -- phase
+
+    Returns
+    ----------
+    jac : complex array
+        [d/df0, d/dA, d/dgamma, d/dphi] - shape (4, len(f))
+
+    Notes
+    ----------
+    Used formula (complex_lorentz written as a single fraction)
+
+    .. math::
+        Ae^{i\phi}\\frac{\gamma - i(f-f_0)}{\gamma^2 + (f-f_0)^2} = \\frac{Ae^{i\phi}}{\gamma + i(f-f_0)}
+
+    """
+    denom = gamma + 1j*(f - f0)
+    unit = np.exp(1j*phi)/denom
+    d_gamma = -A*unit/denom
+    return np.array([-1j*d_gamma, unit, d_gamma, 1j*A*unit])
+
+# sum of complex lorentzians + complex linear background
+def complex_lorentz_multi(f, *params):
+    """Sum of K complex lorentzians with common complex linear background
+
+    Parameters
+    ----------
+    f : float or array_like
+        frequency
+    params : floats
+        f0_1, A_1, gamma_1, phi_1, ..., f0_K, A_K, gamma_K, phi_K, a_real, b_real, a_imag, b_imag \n
+        K groups of complex_lorentz parameters followed by the parameters of linear background
+
+    Returns
+    ----------
+    value : complex float or array
+        sum of complex lorentzians with complex linear background
+
+    Notes
+    ----------
+    Number of peaks K = (len(params) - 4)/4. Used formula
+
+    .. math::
+        \sum_k A_ke^{i\phi_k}\\frac{\gamma_k - i(f-f_{0,k})}{\gamma_k^2 + (f-f_{0,k})^2} + (a_{imag}+a_{real})f + (b_{imag} + b_{real})
+
+    """
+    n_peaks = (len(params) - 4)//4
+    a_real, b_real, a_imag, b_imag = params[-4:]
+    sig = (a_real + 1j*a_imag)*f + (b_real + 1j*b_imag)
+    for k in range(n_peaks):
+        sig = sig + complex_lorentz(f, *params[4*k:4*k+4])
+    return sig
+
+# vector model for complex_lorentz_multi
+def vec_model_multi(freq, *params):
+    """Vector model for sum of complex lorentzians with complex linear background (complex_lorentz_multi)
+
+    Parameters
+    ----------
+    freq : array_like
+        frequency
+    params : floats
+        parameters of complex_lorentz_multi
+
+    Returns
+    ----------
+    vec_model : array
+        length(vec_model) = 2*length(freq)
+
+    """
+    sig = complex_lorentz_multi(freq, *params)
+    return np.hstack([sig.real, sig.imag])
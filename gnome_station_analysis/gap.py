@@ -0,0 +1,185 @@
+import os
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from . import read
+from . import kernels
+
+# gap between two FIDs in a single step change measurement
+def gap(time_sig, signal_window = (0.3, 0.5), reference_window = (0.8, 1.0)):
+    """Obtains gap between two FIDs that are included in single signal
+
+    Parameters
+    ----------
+    time_sig : array of floats
+        signal in time domain
+    signal_window : tuple
+        (start, stop) - window of the first FID as fractions of the signal length (optional)
+    reference_window : tuple
+        (start, stop) - window of the second FID as fractions of the signal length (optional)
+
+    Returns
+    -------
+    sig_gap : float
+        mean in signal_window minus mean in reference_window
+
+    """
+    avg2, avg1 = kernels.window_means(kernels.cumulative(time_sig), [signal_window, reference_window])
+    return avg2 - avg1
+
+# reads signal column of the file, cumulative sum is cached in cache_dir (if given)
+def file_cumulative(file_name, column = 1, cache_dir = None):
+    """Reads the signal from the file and computes its cumulative sum
+
+    Parameters
+    ----------
+    file_name : string
+        single file path
+    column : int
+        column of the signal in the file (optional)
+    cache_dir : string
+        directory for cached cumulative sums (optional) \n
+        when given, the ASCII file is parsed only once and later calls read .npy file from the cache \n
+        cached sums are named after the file and a hash of its absolute path
+
+    Returns
+    -------
+    csum : array of floats
+        cumulative sum returned by kernels.cumulative()
+
+    """
+    if cache_dir is not None:
+        # cache is keyed on the absolute path (files with the same name may lie in different directories)
+        key = hashlib.sha1(os.path.abspath(file_name).encode()).hexdigest()[:16]
+        cache_name = os.path.join(cache_dir, "%s.%s.csum%d.npy" % (os.path.basename(file_name), key, column))
+        if os.path.exists(cache_name) and os.path.getmtime(cache_name) >= os.path.getmtime(file_name):
+            return np.load(cache_name)
+    csum = kernels.cumulative(np.loadtxt(file_name, usecols = column))
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok = True)
+        np.save(cache_name, csum)
+    return csum
+
+# gap for a single file (used by all_gaps)
+def file_gap(file_name, signal_window = (0.3, 0.5), reference_window = (0.8, 1.0), column = 1, cache_dir = None):
+    """Obtains gap between two FIDs saved in the given file
+
+    Parameters
+    ----------
+    file_name : string
+        single file path
+    signal_window : tuple
+        (start, stop) - window of the first FID as fractions of the signal length (optional)
+    reference_window : tuple
+        (start, stop) - window of the second FID as fractions of the signal length (optional)
+    column : int
+        column of the signal in the file (optional)
+    cache_dir : string
+        directory for cached cumulative sums (optional)
+
+    Returns
+    -------
+    sig_gap : float
+        gap between the two FIDs
+
+    """
+    csum = file_cumulative(file_name, column = column, cache_dir = cache_dir)
+    avg2, avg1 = kernels.window_means(csum, [signal_window, reference_window])
+    return avg2 - avg1
+
+# gaps for all files in a directory (sorted by current)
+def all_gaps(directory, signal_window = (0.3, 0.5), reference_window = (0.8, 1.0), column = 1, cache_dir = None, processes = None):
+    """Obtains gaps for all step change measurements in a given directory
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of step change measurements
+    signal_window : tuple
+        (start, stop) - window of the first FID as fractions of the signal length (optional)
+    reference_window : tuple
+        (start, stop) - window of the second FID as fractions of the signal length (optional)
+    column : int
+        column of the signal in the files (optional)
+    cache_dir : string
+        directory for cached cumulative sums (optional)
+    processes : int
+        number of worker processes (optional) \n
+        if processes = 1 files are analysed in the main process, if None the number of CPUs is used
+
+    Returns
+    -------
+    currents, gaps : array of floats, array of floats
+        arrays sorted by rising current values
+
+    """
+    file_names, currents = read.all_names_currents(directory)
+    worker = partial(file_gap, signal_window = signal_window, reference_window = reference_window, column = column, cache_dir = cache_dir)
+    if processes == 1:
+        gaps = list(map(worker, file_names))
+    else:
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            gaps = list(pool.map(worker, file_names, chunksize = 8))
+    return currents, np.array(gaps)
+
+# fits line to gap(current) and returns current for which gap = 0
+def zero_crossing(currents, gaps):
+    """Finds zero crossing of linear fit to gap(current)
+
+    Parameters
+    ----------
+    currents : array of floats
+        current values
+    gaps : array of floats
+        gaps corresponding to currents
+
+    Returns
+    -------
+    curr_0, curr_0_err, popt, pcov : float, float, array, array
+        current of the zero crossing with its error, popt = [slope, intersection] and covariance matrix pcov
+
+    Notes
+    -----
+    The error of curr_0 = -intersection/slope is propagated from the full covariance matrix of the linear fit.
+
+    """
+    popt, pcov = np.polyfit(currents, gaps, 1, cov = True)
+    slope, intersection = popt
+    curr_0 = -intersection/slope
+    grad = np.array([intersection/slope**2, -1/slope])
+    curr_0_err = np.sqrt(grad @ pcov @ grad)
+    return curr_0, curr_0_err, popt, pcov
+
+# compensation point for the directory with step change measurements
+def compensation_point(directory, signal_window = (0.3, 0.5), reference_window = (0.8, 1.0), column = 1, cache_dir = None, processes = None):
+    """Obtains compensation point from step change measurements in a given directory
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of step change measurements
+    signal_window : tuple
+        (start, stop) - window of the first FID as fractions of the signal length (optional)
+    reference_window : tuple
+        (start, stop) - window of the second FID as fractions of the signal length (optional)
+    column : int
+        column of the signal in the files (optional)
+    cache_dir : string
+        directory for cached cumulative sums (optional)
+    processes : int
+        number of worker processes (optional)
+
+    Returns
+    -------
+    curr_0, curr_0_err : float, float
+        current value (in uA) for which the gap vanishes and its error
+
+    Notes
+    -----
+    See all_gaps() and zero_crossing() for details.
+
+    """
+    currents, gaps = all_gaps(directory, signal_window = signal_window, reference_window = reference_window, column = column, cache_dir = cache_dir, processes = processes)
+    curr_0, curr_0_err, popt, pcov = zero_crossing(currents, gaps)
+    return curr_0, curr_0_err
@@ -0,0 +1,237 @@
+import numpy as np
+from . import functions as func
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# "numpy" (default) or "numba", changed only with set_backend()
+_backend = "numpy"
+_numba_kernels = None
+
+def available_backends():
+    """
+    Returns
+    -------
+    backends : list of strings
+        backends that may be used on this machine ("numba" only when Numba is installed)
+    """
+    if numba is None:
+        return ["numpy"]
+    return ["numpy", "numba"]
+
+def set_backend(name):
+    """Selects backend of the computational kernels.
+
+    Parameters
+    ----------
+    name : string
+        "numpy" - pure NumPy (default), "numba" - kernels compiled with Numba
+
+    Notes
+    -----
+    Numba kernels are compiled on the first selection of "numba" backend (compiled code is cached on disk).
+    ImportError is raised when Numba is not installed, so the backend is never changed silently.
+
+    """
+    global _backend
+    if name not in ("numpy", "numba"):
+        raise ValueError("Unknown backend: " + str(name))
+    if name == "numba":
+        if numba is None:
+            raise ImportError("Numba backend requires numba package (pip install numba).")
+        _compile()
+    _backend = name
+
+def get_backend():
+    """
+    Returns
+    -------
+    name : string
+        name of the selected backend
+    """
+    return _backend
+
+# compiles Numba versions of the kernels
+def _compile():
+    global _numba_kernels
+    if _numba_kernels is not None:
+        return
+    njit = numba.njit(cache = True)
+
+    @njit
+    def residual_jac(freq, sig_vector, f0, A, gamma, phi, a_real, b_real, a_imag, b_imag):
+        size = freq.shape[0]
+        res = np.empty(2*size)
+        jac = np.empty((2*size, 8))
+        cos = np.cos(phi)
+        sin = np.sin(phi)
+        for i in range(size):
+            d = freq[i] - f0
+            den = gamma*gamma + d*d
+            u_r = (cos*gamma + sin*d)/den
+            u_i = (sin*gamma - cos*d)/den
+            g_r = -A*(u_r*gamma + u_i*d)/den
+            g_i = -A*(u_i*gamma - u_r*d)/den
+            res[i] = A*u_r + a_real*freq[i] + b_real - sig_vector[i]
+            res[size + i] = A*u_i + a_imag*freq[i] + b_imag - sig_vector[size + i]
+            jac[i, 0] = g_i
+            jac[size + i, 0] = -g_r
+            jac[i, 1] = u_r
+            jac[size + i, 1] = u_i
+            jac[i, 2] = g_r
+            jac[size + i, 2] = g_i
+            jac[i, 3] = -A*u_i
+            jac[size + i, 3] = A*u_r
+            jac[i, 4] = freq[i]
+            jac[size + i, 4] = 0.
+            jac[i, 5] = 1.
+            jac[size + i, 5] = 0.
+            jac[i, 6] = 0.
+            jac[size + i, 6] = freq[i]
+            jac[i, 7] = 0.
+            jac[size + i, 7] = 1.
+        return res, jac
+
+    @njit
+    def band(freq, fft, fmin, fmax):
+        count = 0
+        for i in range(freq.shape[0]):
+            if freq[i] >= fmin and freq[i] <= fmax:
+                count += 1
+        freq_out = np.empty(count, dtype = freq.dtype)
+        fft_out = np.empty(count, dtype = fft.dtype)
+        j = 0
+        for i in range(freq.shape[0]):
+            if freq[i] >= fmin and freq[i] <= fmax:
+                freq_out[j] = freq[i]
+                fft_out[j] = fft[i]
+                j += 1
+        return freq_out, fft_out
+
+    @njit
+    def cumulative(time_sig):
+        csum = np.empty(time_sig.shape[0] + 1)
+        csum[0] = 0.
+        for i in range(time_sig.shape[0]):
+            csum[i + 1] = csum[i] + time_sig[i]
+        return csum
+
+    @njit
+    def window_means(csum, starts, stops):
+        means = np.empty(starts.shape[0])
+        for k in range(starts.shape[0]):
+            means[k] = (csum[stops[k]] - csum[starts[k]])/(stops[k] - starts[k])
+        return means
+
+    _numba_kernels = {"residual_jac": residual_jac, "band": band, "cumulative": cumulative, "window_means": window_means}
+
+# residuals and jacobian computed together
+def residual_jac(freq, sig_vector, params):
+    """Residuals and jacobian of the vector model in a single pass
+
+    Parameters
+    ----------
+    freq : array
+        frequency
+    sig_vector : array
+        measured signal as [real part, imaginary part]
+    params : array
+        [f0, A, gamma, phi] or [f0, A, gamma, phi, a_real, b_real, a_imag, b_imag]
+
+    Returns
+    -------
+    res, jac : array, array
+        residuals (model - sig_vector) and jacobian of shape (2*len(freq), len(params))
+
+    """
+    n_params = len(params)
+    full = np.zeros(8)
+    full[:n_params] = params
+    if _backend == "numba":
+        res, jac = _numba_kernels["residual_jac"](np.asarray(freq, dtype = float), np.asarray(sig_vector, dtype = float), *full)
+        return res, jac[:, :n_params]
+    freq = np.asarray(freq, dtype = float)
+    res = func.vec_model_lin_back(freq, *full) - sig_vector
+    derivs = func.complex_lorentz_jac(freq, *full[:4])
+    jac = np.empty((2*len(freq), n_params))
+    jac[:, :4] = np.hstack([derivs.real, derivs.imag]).T
+    if n_params == 8:
+        zeros = np.zeros(len(freq))
+        ones = np.ones(len(freq))
+        jac[:, 4:] = np.array([np.hstack([freq, zeros]), np.hstack([ones, zeros]), np.hstack([zeros, freq]), np.hstack([zeros, ones])]).T
+    return res, jac
+
+# selection of the frequency band of the spectrum
+def band(freq, fft, fmin, fmax):
+    """Selects part of the spectrum with fmin <= freq <= fmax
+
+    Parameters
+    ----------
+    freq : array
+        frequency scale
+    fft : complex array
+        spectrum
+    fmin, fmax : floats
+        limits of the band
+
+    Returns
+    -------
+    freq, fft : array, complex array
+        selected part of the spectrum
+
+    """
+    if _backend == "numba":
+        return _numba_kernels["band"](freq, fft, fmin, fmax)
+    inds = (freq >= fmin)*(freq <= fmax)
+    return freq[inds], fft[inds]
+
+# cumulative sum of the signal with leading zero, so that sum(sig[i:j]) = csum[j] - csum[i]
+def cumulative(time_sig):
+    """Cumulative sum used for fast window means
+
+    Parameters
+    ----------
+    time_sig : array of floats
+        signal in time domain
+
+    Returns
+    -------
+    csum : array of floats
+        cumulative sum of the signal with leading zero (length = len(time_sig) + 1)
+
+    """
+    if _backend == "numba":
+        return _numba_kernels["cumulative"](np.asarray(time_sig, dtype = float))
+    return np.concatenate([[0.], np.cumsum(time_sig, dtype = float)])
+
+# means of the signal in windows given as fractions of the signal length
+def window_means(csum, windows):
+    """Computes means of the signal in the given windows
+
+    Parameters
+    ----------
+    csum : array of floats
+        cumulative sum returned by cumulative()
+    windows : list of tuples
+        [(start, stop), ...] - windows given as fractions of the signal length (0 to 1)
+
+    Returns
+    -------
+    means : array of floats
+        mean of the signal in each window
+
+    Notes
+    -----
+    Every window costs O(1), the signal itself is summed only once in cumulative().
+    Window (0.3, 0.5) covers the same points as time_sig[int(0.3*length):int(0.5*length)].
+
+    """
+    length = len(csum) - 1
+    windows = np.atleast_2d(windows)
+    starts = (windows[:, 0]*length).astype(np.int64)
+    stops = (windows[:, 1]*length).astype(np.int64)
+    if _backend == "numba":
+        return _numba_kernels["window_means"](np.asarray(csum, dtype = float), starts, stops)
+    return (csum[stops] - csum[starts])/(stops - starts)
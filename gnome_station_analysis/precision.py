@@ -0,0 +1,101 @@
+import time
+import numpy as np
+
+# "double" (default) or "single", changed only with set_precision()
+_precision = "double"
+
+def set_precision(name):
+    """Selects precision of the data processing.
+
+    Parameters
+    ----------
+    name : string
+        "double" - float64/complex128 (default), \n
+        "single" - raw data, FFT and model evaluations in float32/complex64
+
+    Notes
+    -----
+    In single precision mode read.file(), read.file_chunks() and read.comp_fft() return float32/complex64 signals and
+    the fits evaluate models in float32 (see fit.precise_fit()). Time and frequency scales, fit parameters, the least
+    squares solver, normal equations and covariance matrix stay in float64.
+    Please check the impact on your data with compare() before switching the production analysis.
+
+    """
+    global _precision
+    if name not in ("double", "single"):
+        raise ValueError("Unknown precision: " + str(name))
+    _precision = name
+
+def get_precision():
+    """
+    Returns
+    -------
+    name : string
+        selected precision
+    """
+    return _precision
+
+def real_dtype():
+    """
+    Returns
+    -------
+    dtype : numpy dtype
+        float32 in single precision mode, float64 otherwise
+    """
+    return np.float32 if _precision == "single" else np.float64
+
+def complex_dtype():
+    """
+    Returns
+    -------
+    dtype : numpy dtype
+        complex64 in single precision mode, complex128 otherwise
+    """
+    return np.complex64 if _precision == "single" else np.complex128
+
+# fits the spectrum in both precisions and compares results, time and memory
+def compare(freq, sig, linear_background = True, repeat = 5):
+    """Compares fits of the spectrum in double and single precision.
+
+    Parameters
+    ----------
+    freq : array
+        frequency scale in Hz
+    sig : complex array
+        complex lorentzian signal
+    linear_background : bool
+        when true fit.complex_lorentz_lin_back() is used, when false - fit.complex_lorentz() (optional)
+    repeat : int
+        number of repeated fits for time measurement (optional)
+
+    Returns
+    -------
+    result : dict
+        "f0_shift", "gamma_shift" - differences between single and double precision in units of the double precision errors, \n
+        "time_double", "time_single" - mean time of a single fit in s, \n
+        "bytes_double", "bytes_single" - memory used by freq (always float64) and sig
+
+    """
+    from . import fit
+    fit_function = fit.complex_lorentz_lin_back if linear_background else fit.complex_lorentz
+    previous = get_precision()
+    result = {}
+    popts = {}
+    try:
+        for name in ("double", "single"):
+            set_precision(name)
+            freq_p = np.asarray(freq, dtype = float)
+            sig_p = np.asarray(sig, dtype = complex_dtype())
+            start = time.perf_counter()
+            for i in range(repeat):
+                popt, pcov = fit_function(freq_p, sig_p)
+            result["time_" + name] = (time.perf_counter() - start)/repeat
+            result["bytes_" + name] = freq_p.nbytes + sig_p.nbytes
+            popts[name] = popt
+            if name == "double":
+                errors = np.sqrt(np.diag(pcov))
+    finally:
+        set_precision(previous)
+    result["f0_shift"] = (popts["single"][0] - popts["double"][0])/errors[0]
+    result["gamma_shift"] = (popts["single"][2] - popts["double"][2])/errors[2]
+    return result
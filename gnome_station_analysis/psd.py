@@ -0,0 +1,200 @@
+import numpy as np
+from scipy import signal
+from numpy.lib.stride_tricks import sliding_window_view
+from . import read
+
+class welch:
+    """Streaming Welch estimate of the power spectral density of a long time series.
+
+    Parameters
+    ----------
+    fs : float
+        sampling frequency in Hz
+    nperseg : int
+        length of a single segment (optional)
+    overlap : float
+        overlap of the segments as a fraction of nperseg (optional)
+    window : string or tuple
+        window passed to scipy.signal.get_window() (optional)
+    bands : list of tuples
+        [(fmin, fmax), ...] - frequency bands in Hz of the reported noise levels (optional)
+    cadence : int
+        number of segments between the reports of the noise levels (optional) \n
+        if cadence = 0 noise levels are not reported
+
+    Notes
+    -----
+    Data are given chunk by chunk with update method. Only the running sum of the periodograms (and the last
+    incomplete segment) is kept in memory. All complete segments of the chunk are transformed at once with 2-D FFT.
+    The result is the same as scipy.signal.welch() of the whole time series (density scaling, constant detrend).
+
+    """
+
+    def __init__(self, fs, nperseg = 4096, overlap = 0.5, window = "hann", bands = [], cadence = 0):
+        """Creates empty estimator.
+
+        Parameters
+        ----------
+        fs : float
+            sampling frequency in Hz
+        nperseg : int
+            length of a single segment (optional)
+        overlap : float
+            overlap of the segments as a fraction of nperseg (optional)
+        window : string or tuple
+            window passed to scipy.signal.get_window() (optional)
+        bands : list of tuples
+            [(fmin, fmax), ...] - frequency bands in Hz of the reported noise levels (optional)
+        cadence : int
+            number of segments between the reports of the noise levels (optional)
+        """
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg - int(overlap*nperseg)
+        self.window = signal.get_window(window, nperseg)
+        self.scale = 1/(fs*np.sum(self.window**2))
+        self.freq = np.fft.rfftfreq(nperseg, 1/fs)
+        self.bands = bands
+        self.cadence = cadence
+        self.buffer = np.zeros(0)
+        self.sum = np.zeros(len(self.freq))
+        self.count = 0
+        self.interval_sum = np.zeros(len(self.freq))
+        self.interval_count = 0
+        self.report_times = []
+        self.report_levels = []
+
+    def update(self, chunk):
+        """Adds the next chunk of the time series.
+
+        Parameters
+        ----------
+        chunk : array
+            next samples of the time series
+        """
+        data = np.concatenate([self.buffer, np.asarray(chunk, dtype = float)])
+        if len(data) < self.nperseg:
+            self.buffer = data
+            return
+        n_seg = (len(data) - self.nperseg)//self.step + 1
+        segments = sliding_window_view(data, self.nperseg)[::self.step][:n_seg]
+        segments = segments - np.mean(segments, axis = 1, keepdims = True)
+        spectra = np.abs(np.fft.rfft(segments*self.window, axis = 1))**2
+        self.buffer = data[n_seg*self.step:]
+        if self.cadence <= 0:
+            self.sum += np.sum(spectra, axis = 0)
+            self.count += n_seg
+            return
+        i = 0
+        while i < n_seg:
+            k = min(n_seg - i, self.cadence - self.interval_count)
+            part = np.sum(spectra[i:i+k], axis = 0)
+            self.sum += part
+            self.count += k
+            self.interval_sum += part
+            self.interval_count += k
+            i += k
+            if self.interval_count == self.cadence:
+                self.report_times.append(((self.count - 1)*self.step + self.nperseg)/self.fs)
+                self.report_levels.append(self.levels(self._density(self.interval_sum, self.interval_count)))
+                self.interval_sum = np.zeros(len(self.freq))
+                self.interval_count = 0
+
+    # one-sided power spectral density from the sum of periodograms
+    def _density(self, total, count):
+        density = total/count*self.scale
+        if self.nperseg % 2:
+            density[1:] *= 2
+        else:
+            density[1:-1] *= 2
+        return density
+
+    def psd(self):
+        """
+        Returns
+        -------
+        freq, psd : array, array
+            frequency scale in Hz and averaged power spectral density (unit^2/Hz)
+        """
+        if self.count == 0:
+            print("Warning: There is not enough data for a single segment.")
+            return self.freq, np.full(len(self.freq), np.nan)
+        return self.freq, self._density(self.sum, self.count)
+
+    def asd(self):
+        """
+        Returns
+        -------
+        freq, asd : array, array
+            frequency scale in Hz and amplitude spectral density (unit/sqrt(Hz))
+        """
+        freq, psd = self.psd()
+        return freq, np.sqrt(psd)
+
+    def levels(self, psd = None):
+        """Noise floor in the frequency bands.
+
+        Parameters
+        ----------
+        psd : array
+            power spectral density (optional, the running average by default)
+
+        Returns
+        -------
+        levels : array
+            median amplitude spectral density in each band of bands attribute
+
+        Notes
+        -----
+        The median is not sensitive to narrow lines in the band, so it estimates the noise floor.
+
+        """
+        if psd is None:
+            psd = self.psd()[1]
+        levels = []
+        for fmin, fmax in self.bands:
+            inds = (self.freq >= fmin)*(self.freq <= fmax)
+            levels.append(np.sqrt(np.median(psd[inds])) if np.any(inds) else np.nan)
+        return np.array(levels)
+
+    def get_reports(self):
+        """
+        Returns
+        -------
+        times, levels : array, 2-D array
+            end time (in s from the beginning of the data) of each report and noise levels in bands (one row per report)
+        """
+        return np.array(self.report_times), np.array(self.report_levels).reshape(len(self.report_times), len(self.bands))
+
+# streaming Welch estimate for the time series saved in a file
+def from_file(file_name, fs = 0, column = 1, chunk_size = 100000, nperseg = 4096, overlap = 0.5, window = "hann", bands = [], cadence = 0):
+    """Computes streaming Welch estimate of the time series saved in a file
+
+    Parameters
+    ----------
+    file_name : string
+        single file path (time in column 0)
+    fs : float
+        sampling frequency in Hz (optional) \n
+        if fs = 0 it is computed from the first two samples of the time column
+    column : int
+        column of the signal (optional)
+    chunk_size : int
+        number of rows read at once (optional)
+    nperseg, overlap, window, bands, cadence :
+        parameters of welch class (optional)
+
+    Returns
+    -------
+    estimator : welch
+        estimator after processing the whole file
+
+    """
+    estimator = None
+    for time, sig in read.file_chunks(file_name, chunk_size, 0, column):
+        if estimator is None:
+            if fs == 0:
+                fs = 1/(time[1] - time[0])
+            estimator = welch(fs, nperseg = nperseg, overlap = overlap, window = window, bands = bands, cadence = cadence)
+        estimator.update(sig)
+    return estimator
@@ -1,6 +1,9 @@
 import numpy as np
 import re
 import glob
+import itertools
+from . import kernels
+from . import precision
 
 # returns single dimension tables
 # after file_name one specifies which colums of data should be returned (beginning with 0!)
@@ -30,12 +33,58 @@ def file(file_name, *columns):
     data[1] - 3rd column of data \n
     data[2] - 4th column of data
 
+    Notes
+    -----
+    Data are float32 in single precision mode (see precision.set_precision()), except column 0 (time or frequency scale),
+    which is always float64. Only the requested columns are parsed and the signal columns are parsed directly
+    in the selected precision, so no float64 copy of the whole file is made.
+
+    """
+    data = np.loadtxt(file_name, usecols = sorted(set(int(i) for i in columns)), dtype = _dtype(columns), ndmin = 1)
+    return [np.array(data["c%d" % i]) for i in columns]
+
+# record type of the parsed columns, column 0 (time or frequency scale) is always float64
+def _dtype(columns):
+    return np.dtype([("c%d" % i, float if i == 0 else precision.real_dtype()) for i in sorted(set(int(i) for i in columns))])
+
+# yields selected columns of the file in chunks of chunk_size rows (for files too long to be read at once)
+def file_chunks(file_name, chunk_size, *columns):
+    """Reads selected columns in a chosen file chunk by chunk
+
+    Parameters
+    ----------
+    file_name : string
+    chunk_size : int
+        number of rows in a single chunk
+    columns : int (multiple)
+        specifies which colums of data should be returned (beginning with 0!)
+
+    Yields
+    ------
+    (columns) : list of arrays
+        columns of the next chunk of data listed in parameters after chunk_size
+
+    Examples
+    --------
+
+    for time, sig in gnome_station_analysis.read.file_chunks("name", 100000, 0, 1): \n
+        process(time, sig)
+
+    Notes
+    -----
+    Precision of the columns is the same as in file().
+
     """
-    data = np.loadtxt(file_name)
-    tab = []
-    for i in columns:
-        tab.append(np.array(data[:,i]))
-    return list(tab)
+    with open(file_name) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            lines = [line for line in lines if line.strip() and not line.startswith("#")]
+            if not lines:
+                continue
+            data = np.loadtxt(lines, usecols = sorted(set(int(i) for i in columns)), dtype = _dtype(columns), ndmin = 1)
+            yield [np.array(data["c%d" % i]) for i in columns]
 
 # returns table of file names in a given directory (not sorted!)
 def all_names(directory):
@@ -173,14 +222,13 @@ def comp_fft(time, time_sig, a = 0, b = -1, fmin = 0, fmax = 0):
     Notes
     -----
     The function uses numpy.fft.rfft. Please read numpy documentation for more details.
+    The band is selected with kernels.band() (see kernels.set_backend()).
+    The signal has the precision selected with precision.set_precision(), the frequency scale is always float64.
 
     """
-    fft = np.fft.rfft(time_sig[a:b])
-    freq = np.fft.rfftfreq(len(time[a:b]), time[1]-time[0])
+    fft = np.fft.rfft(time_sig[a:b]).astype(precision.complex_dtype(), copy = False)
+    freq = np.fft.rfftfreq(len(time[a:b]), float(time[1]) - float(time[0]))
 
     if fmax == 0:
         fmax = np.max(freq)
-    ind_1 = np.where(freq >= fmin)
-    ind_2 = np.where(freq <= fmax)
-    inds = np.intersect1d(ind_1, ind_2)
-    return freq[inds], fft[inds]
\ No newline at end of file
+    return kernels.band(freq, fft, fmin, fmax)
\ No newline at end of file
@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 from . import functions as func
 from . import fit
 from . import read
+from . import gap
+from . import ddc
 
 # file_name requires
 class resonance:
@@ -16,10 +18,12 @@ class resonance:
         specifies 3 columns in the data file that include frequency, X and Y measurements
     linear_background : bool
         when true fit.complex_lorentz_lin_back() is used, when false - fit.complex_lorentz()
+    archive : archive.archive
+        when given, data are read from the archive entry file_name (index or file name) instead of the file (optional)
 
     """
 
-    def __init__(self, file_name, linear_background = True, columns = [0,1,2], freq_min = 0, freq_max=0):
+    def __init__(self, file_name, linear_background = True, columns = [0,1,2], freq_min = 0, freq_max=0, archive = None):
         """Reads data from the given file.
 
         Parameters
@@ -30,15 +34,23 @@ class resonance:
             Minimal frequency to read
         freq_max : float
             Maximal frequency to read
+        archive : archive.archive
+            archive with packed measurements (optional), file_name is then the index or the name of the entry
         """
-        try:
-            self.current = read.current(file_name)
-        except:
-            self.current = np.nan
-            print("Achtung! Reading current value from the file name was unsuccesfull.")
-            print("You may still use the class but remember that get_current() will return fake value.")
-        self.file_name = file_name
-        freq, X, Y = read.file(file_name, *columns) # uwaga na liczenie phi - wykorzystać numpy.arctan2()
+        if archive is not None:
+            entry = archive.index(file_name)
+            self.current = archive.currents[entry]
+            self.file_name = archive.file_names[entry]
+            freq, X, Y = archive.file(entry, *columns)
+        else:
+            try:
+                self.current = read.current(file_name)
+            except:
+                self.current = np.nan
+                print("Achtung! Reading current value from the file name was unsuccesfull.")
+                print("You may still use the class but remember that get_current() will return fake value.")
+            self.file_name = file_name
+            freq, X, Y = read.file(file_name, *columns) # uwaga na liczenie phi - wykorzystać numpy.arctan2()
         if freq_max != 0:
             inds = (np.array(freq) >= freq_min) * (np.array(freq) <= freq_max)
             freq = freq[inds]
@@ -51,6 +63,7 @@ class resonance:
         self.sig = X + 1j*Y
         self.R = R
         self.phi = phi
+        self.sigma = None
         self.fit_bool = False
         self.read_bool = True
 
@@ -70,19 +83,191 @@ class resonance:
             print("Error: Please use comp_fft method to get complex lorentzian before fitting.")
         if linear_background:
             self.model = func.complex_lorentz_lin_back
-            self.popt, self.pcov = fit.complex_lorentz_lin_back(self.freq, self.sig, p0)
+            self.popt, self.pcov = fit.complex_lorentz_lin_back(self.freq, self.sig, p0, sigma = self.sigma)
         if linear_background_doubleside:
             self.model = func.complex_lorentz_doubleside_lin_back
-            self.popt, self.pcov = fit.complex_lorentz_doubleside_lin_back(self.freq, self.sig, p0)
+            self.popt, self.pcov = fit.complex_lorentz_doubleside_lin_back(self.freq, self.sig, p0, sigma = self.sigma)
         if lorentz_doubleside:
             self.model = func.complex_lorentz_doubleside_lin_back
-            self.popt, self.pcov = fit.complex_lorentz_doubleside_lin_back(self.freq, self.sig, p0)
+            self.popt, self.pcov = fit.complex_lorentz_doubleside_lin_back(self.freq, self.sig, p0, sigma = self.sigma)
+        else:
+            self.model = func.complex_lorentz
+            self.popt, self.pcov = fit.complex_lorentz(self.freq, self.sig, p0, sigma = self.sigma)
+
+        self.fit_bool = True
+
+    def fit_robust(self, p0 = [], linear_background = True, max_time = 5, max_nfev = 1000):
+        """Fitting complex lorentzian with early failure detection and escalating retry strategies.
+
+        Parameters
+        ----------
+        p0 : list
+            [f0, A, gamma, phi] initial parameters (optional)
+        linear_background : bool
+            when true complex lorentzian with linear background is fitted (optional)
+        max_time : float
+            maximal time in seconds spent on the fit (optional)
+        max_nfev : int
+            maximal number of function evaluations of a single strategy (optional)
+
+        Returns
+        -------
+        success : bool
+            False when all strategies failed (fit parameters are then np.nan)
+
+        Notes
+        -----
+        Please see fit.robust() for the list of strategies. Description of the successful strategy is saved in fit_info attribute.
+
+        """
+        if not self.read_bool:
+            print("Error: Please use comp_fft method to get complex lorentzian before fitting.")
+        self.popt, self.pcov, self.fit_info = fit.robust(self.freq, self.sig, p0 = p0, linear_background = linear_background, max_time = max_time, max_nfev = max_nfev, sigma = self.sigma)
+        if self.fit_info["linear_background"]:
+            self.model = func.complex_lorentz_lin_back
         else:
             self.model = func.complex_lorentz
-            self.popt, self.pcov = fit.complex_lorentz(self.freq, self.sig, p0)
+        self.fit_bool = True
+        return self.fit_info["strategy"] is not None
 
+    def fit_multi(self, n_peaks = 0, p0 = [], prominence = 0.1, window = 20):
+        """Fitting sum of complex lorentzians with common linear background (for spectra with several lines).
+
+        Parameters
+        ----------
+        n_peaks : int
+            number of peaks (optional) \n
+            if n_peaks = 0 all peaks found by fit.find_peaks() are fitted
+        p0 : list
+            [f0_1, A_1, gamma_1, phi_1, ..., f0_K, A_K, gamma_K, phi_K] initial parameters (optional)
+        prominence : float
+            minimal prominence of the peak as a fraction of the signal range (optional)
+        window : float
+            half width (in gamma) of the jacobian block of each peak (optional)
+
+        Notes
+        -----
+        Parameters of k-th peak are available with get_f0(k), get_gamma(k) etc. (peaks are sorted by frequency).
+
+        """
+        if not self.read_bool:
+            print("Error: Please use comp_fft method to get complex lorentzian before fitting.")
+        self.model = func.complex_lorentz_multi
+        self.popt, self.pcov = fit.complex_lorentz_multi(self.freq, self.sig, n_peaks = n_peaks, p0 = p0, prominence = prominence, window = window)
+        self.n_peaks = (len(self.popt) - 4)//4
         self.fit_bool = True
 
+    def bootstrap(self, n_boot = 200, method = "residual", level = 0.6827, n_blocks = 20, contiguous = False, processes = None, seed = None):
+        """Bootstrap (or jackknife) confidence intervals of the fit parameters.
+
+        Parameters
+        ----------
+        n_boot : int
+            number of bootstrap data sets (optional)
+        method : string
+            "residual" or "jackknife" (optional)
+        level : float
+            confidence level of the intervals (optional, default is one sigma)
+        n_blocks : int
+            number of groups for jackknife method (optional)
+        contiguous : bool
+            if true jackknife groups are contiguous frequency blocks (for correlated noise) (optional)
+        processes : int
+            if given, data sets are refitted with curve_fit in a process pool instead of the batched solver (optional)
+        seed : int
+            seed of the random number generator (optional)
+
+        Returns
+        -------
+        ci : array
+            ci[0] - lower bounds and ci[1] - upper bounds of the fit parameters
+
+        Notes
+        -----
+        Please see fit.bootstrap() for details. Fit method must be run first.
+
+        """
+        if not self.fit_bool:
+            print("Error: Please run fit method before bootstrap!")
+            return -1
+        self.popt_boot, self.ci = fit.bootstrap(self.model, self.freq, self.sig, self.popt, n_boot = n_boot, method = method, level = level, n_blocks = n_blocks, contiguous = contiguous, processes = processes, seed = seed)
+        return self.ci
+
+    # returns confidence interval of i-th fit parameter
+    def get_ci(self, i):
+        """Method returns confidence interval of i-th fit parameter obtained with bootstrap method
+
+        Parameters
+        ----------
+        i : int
+            number of the fit parameter
+
+        Returns
+        -------
+        low, high : float, float
+            lower and upper bound of the interval
+        """
+        if hasattr(self, "ci"):
+            return self.ci[0][i], self.ci[1][i]
+        print("Error: Please run bootstrap method before getting confidence intervals!")
+        return np.nan, np.nan
+
+    # returns f0 confidence interval
+    def get_f0_ci(self, peak = 0):
+        """
+
+        Returns
+        -------
+        low, high : float, float
+            confidence interval of resonant frequency in Hz
+        """
+        return self.get_ci(4*peak)
+
+    # returns gamma confidence interval
+    def get_gamma_ci(self, peak = 0):
+        """
+
+        Returns
+        -------
+        low, high : float, float
+            confidence interval of resonance width in Hz
+        """
+        return self.get_ci(4*peak + 2)
+
+    def auto_crop(self, width = 10, core = 3, decimate = 1):
+        """Cropping the data to the neighbourhood of the resonance before fitting.
+
+        Parameters
+        ----------
+        width : float
+            half width of the window in units of gamma (optional)
+        core : float
+            half width (in units of gamma) of the central part that is never decimated (optional)
+        decimate : int
+            number of wing points averaged into one point (optional)
+
+        Returns
+        -------
+        crop : dict
+            crop description (see fit.crop()), it is also saved in crop attribute
+
+        Notes
+        -----
+        f0 and gamma are estimated without fitting (see fit.estimate()). Data outside the window are removed from the object.
+        Uncertainties of the averaged points are saved in sigma attribute and used by fit and fit_robust methods.
+
+        """
+        if not self.read_bool:
+            print("Error: Please use comp_fft method to get complex lorentzian before cropping.")
+        variance = np.ones(len(self.freq)) if self.sigma is None else self.sigma**2
+        freq, sig, counts, self.crop = fit.crop(self.freq, self.sig, width = width, core = core, decimate = decimate)
+        self.sigma = np.sqrt(fit.apply_crop(self.freq, variance, self.crop)[1]/counts)
+        self.freq = freq
+        self.sig = sig
+        self.R = np.abs(sig)
+        self.phi = np.arctan2(sig.real, sig.imag)
+        return self.crop
+
     def get_current(self):
         """Gets current from the name of the analyzed file.
 
@@ -141,48 +326,68 @@ class resonance:
         return 0
 
     # returns f0
-    def get_f0(self):
+    def get_f0(self, peak = 0):
         """
 
+        Parameters
+        ----------
+        peak : int
+            number of the peak, only for fit_multi method (optional)
+
         Returns
         -------
         f0 : float
             resonant frequency in Hz
         """
-        return self.get_param(0)
+        return self.get_param(4*peak)
 
     # returns f0 error
-    def get_f0_err(self):
+    def get_f0_err(self, peak = 0):
         """
 
+        Parameters
+        ----------
+        peak : int
+            number of the peak, only for fit_multi method (optional)
+
         Returns
         -------
         f0_err : float
             resonant frequency error in Hz
         """
-        return self.get_err(0)
+        return self.get_err(4*peak)
 
     # returns gamma
-    def get_gamma(self):
+    def get_gamma(self, peak = 0):
         """
 
+        Parameters
+        ----------
+        peak : int
+            number of the peak, only for fit_multi method (optional)
+
         Returns
         -------
         gamma : float
             resonance width in Hz
         """
-        return self.get_param(2)
+        return self.get_param(4*peak + 2)
 
     # returns gamma error
-    def get_gamma_err(self):
+    def get_gamma_err(self, peak = 0):
         """
 
+        Parameters
+        ----------
+        peak : int
+            number of the peak, only for fit_multi method (optional)
+
         Returns
         -------
         gamma_err : float
             resonance width error in Hz
         """
-        return self.get_err(2)
+        return self.get_err(4*peak + 2)
 
     def plot_real(self, plot_fit = False):
         """Plots real part of the measured resonance and fitted function (if chosen).
@@ -253,7 +458,7 @@ class FID(resonance):
 
     """
 
-    def __init__(self, file_name, t_min = 0, t_max = 0 ):
+    def __init__(self, file_name, t_min = 0, t_max = 0, archive = None):
         """Converting time signal (FID) into frequency domain complex lorentzian resonance.
         Fit to the measurement data isn't run automatically. Please use fit method before getting parameters.
 
@@ -262,15 +467,23 @@ class FID(resonance):
         ----------
         file_name : string
             path to file with measured resonance
+        archive : archive.archive
+            archive with packed measurements (optional), file_name is then the index or the name of the entry
 
         Notes
         -----
         FID class is child of resonance class, so all resonance methods are available here.
 
         """
-        self.current = read.current(file_name)
-        self.file_name = file_name
-        time, time_sig = read.file(file_name, 0, 1)
+        if archive is not None:
+            entry = archive.index(file_name)
+            self.current = archive.currents[entry]
+            self.file_name = archive.file_names[entry]
+            time, time_sig = archive.file(entry, 0, 1)
+        else:
+            self.current = read.current(file_name)
+            self.file_name = file_name
+            time, time_sig = read.file(file_name, 0, 1)
         if t_max != 0:
             inds = (np.array(time) >= t_min) * (np.array(time) <= t_max)
             time = time[inds]
@@ -280,6 +493,41 @@ class FID(resonance):
         self.read_bool = False # read_bool is True when complex lorentzian signal is ready - in case of FID class this is after comp_fft method is run
         self.fit_bool = False
         self.sig_gap = 0
+        self.baseband = None
+
+    def downconvert(self, f_c = 0, decimation = 16, numtaps = 0, a = 0, b = -1):
+        """Mixing the FID to baseband around f_c, low-pass filtering and decimation.
+        After this comp_fft computes short complex FFT of the baseband signal with absolute frequency scale.
+
+        Parameters
+        ----------
+        f_c : float
+            centre frequency in Hz (optional) \n
+            if f_c = 0 it is the frequency of the strongest line (see ddc.auto_center())
+        decimation : int
+            decimation factor (optional) \n
+            the resonance must lie within f_c +/- 0.4*(sampling frequency)/decimation
+        numtaps : int
+            length of FIR low-pass filter (optional)
+        a : int
+            element of the time array defining the beginning of the interval that is going to be used (optional)
+        b : int
+            element of the time array defining the end of the interval that is going to be used (optional)
+
+        Returns
+        -------
+        f_c : float
+            centre frequency in Hz
+
+        """
+        time = self.time[a:b]
+        time_sig = self.time_sig[a:b]
+        if f_c == 0:
+            f_c = ddc.auto_center(time, time_sig)
+        self.f_c = f_c
+        self.decimation = decimation
+        self.time_dec, self.baseband = ddc.downconvert(time, time_sig, f_c, decimation, numtaps = numtaps)
+        return f_c
 
     def comp_fft(self, a = 0, b = -1, fmin = 0, fmax = 0 ):
         """Converting time signal (FID) into frequency domain complex lorentzian resonance.
@@ -297,8 +545,15 @@ class FID(resonance):
             maximal value of the frequency scale in Hz (optional) \n
             if fmax = 0 the maximal value of freq scale is taken (Nyquist frequency)
 
+        Notes
+        -----
+        After downconvert method the spectrum is computed from the baseband signal (a and b are then ignored, please give them to downconvert).
+
         """
-        freq, fft = read.comp_fft(self.time, self.time_sig, a = a, b = b, fmin = fmin, fmax = fmax)
+        if self.baseband is not None:
+            freq, fft = ddc.comp_fft(self.time_dec, self.baseband, self.f_c, self.decimation, fmin = fmin, fmax = fmax)
+        else:
+            freq, fft = read.comp_fft(self.time, self.time_sig, a = a, b = b, fmin = fmin, fmax = fmax)
         self.freq = freq
         self.sig = fft
         self.read_bool = True
@@ -312,10 +567,17 @@ class FID(resonance):
         plt.ylabel("Signal")
         plt.show()
 
-    def fit_gap(self):
+    def fit_gap(self, signal_window = (0.3, 0.5), reference_window = (0.8, 1.0)):
         """Obtains gap between two FIDs that are included in single file.
         This is only for "step change" measurements (for example when obtaining compensation point).
 
+        Parameters
+        ----------
+        signal_window : tuple
+            (start, stop) - window of the first FID as fractions of the signal length (optional)
+        reference_window : tuple
+            (start, stop) - window of the second FID as fractions of the signal length (optional)
+
         Returns
         -------
         sig_gap : float
@@ -324,12 +586,10 @@ class FID(resonance):
         Notes
         -----
         Each FID in the given file must cover exactly half of the measurement points.
+        To analyse the whole directory of step change measurements please use gap.compensation_point().
 
         """
-        length = len(self.time_sig)
-        avg1 = np.mean(self.time_sig[int(0.8*length):])
-        avg2 = np.mean(self.time_sig[int(0.3*length):int(0.5*length)])
-        self.sig_gap = avg2 - avg1
+        self.sig_gap = gap.gap(self.time_sig, signal_window = signal_window, reference_window = reference_window)
         return self.sig_gap
 
     def get_sig_gap(self):
@@ -346,3 +606,162 @@ class FID(resonance):
             return self.sig_gap
         print("Warning: Did you use fit_gap before get_sig_gap?")
         return self.sig_gap
+
+class sweep:
+    """Resonances of a current sweep fitted jointly (please see fit.joint()).
+    Fit isn't run automatically. Please use fit method before getting parameters.
+
+    Parameters
+    ----------
+    resonances : list of resonance objects
+        resonances (or FIDs after comp_fft) measured at different currents
+    f0_degree : int
+        degree of the polynomial f0(I) (optional)
+    gamma_degree : int
+        degree of the polynomial gamma(I) (optional)
+
+    Examples
+    --------
+
+    sw = sweep([resonance(name) for name in file_names]) \n
+    sw.fit() \n
+    slope, slope_err = sw.get_param(1), sw.get_err(1)
+
+    """
+
+    def __init__(self, resonances, f0_degree = 1, gamma_degree = 2):
+        """
+        Parameters
+        ----------
+        resonances : list of resonance objects
+            resonances measured at different currents
+        f0_degree : int
+            degree of the polynomial f0(I) (optional)
+        gamma_degree : int
+            degree of the polynomial gamma(I) (optional)
+        """
+        self.resonances = list(resonances)
+        self.currents = np.array([res.get_current() for res in self.resonances], dtype = float)
+        self.f0_degree = f0_degree
+        self.gamma_degree = gamma_degree
+        self.fit_bool = False
+
+    def fit(self, p0 = [], linear_background = True):
+        """Fits all resonances at once with fit.joint().
+
+        Parameters
+        ----------
+        p0 : list
+            [c_0, ..., c_f0_degree, g_0, ..., g_gamma_degree] - initial coefficients of f0(I) and gamma(I) (optional)
+        linear_background : bool
+            when true each resonance has its own complex linear background (optional)
+        """
+        if not all(res.read_bool for res in self.resonances):
+            print("Error: Please use comp_fft method of all FIDs before fitting.")
+            return
+        self.popt, self.pcov, self.nuisance = fit.joint([res.freq for res in self.resonances], [res.sig for res in self.resonances], self.currents,
+                                                        f0_degree = self.f0_degree, gamma_degree = self.gamma_degree,
+                                                        linear_background = linear_background, p0 = p0)
+        self.fit_bool = True
+
+    def get_param(self, i):
+        """
+        Returns
+        -------
+        param : float
+            i-th polynomial coefficient [c_0, ..., c_f0_degree, g_0, ..., g_gamma_degree]
+        """
+        if self.fit_bool:
+            return self.popt[i]
+        print("Error: Please run fit method before getting parameters!")
+        return -1
+
+    def get_err(self, i):
+        """
+        Returns
+        -------
+        err : float
+            error of the i-th polynomial coefficient
+        """
+        if self.fit_bool:
+            return np.sqrt(self.pcov[i][i])
+        print("Error: Please run fit method before getting parameters!")
+        return 0
+
+    # value and error of the fitted polynomial, part = 0 for f0 and 1 for gamma
+    def _trend(self, part, current):
+        if current is None:
+            current = self.currents
+        first = 0 if part == 0 else self.f0_degree + 1
+        degree = self.f0_degree if part == 0 else self.gamma_degree
+        powers = np.asarray(current, dtype = float)[..., None]**np.arange(degree + 1)
+        cov = self.pcov[first:first + degree + 1, first:first + degree + 1]
+        return powers @ self.popt[first:first + degree + 1], np.sqrt(np.einsum("...i,ij,...j->...", powers, cov, powers))
+
+    def get_f0(self, current = None):
+        """
+        Parameters
+        ----------
+        current : float or array
+            coil current (optional, currents of the resonances by default)
+
+        Returns
+        -------
+        f0 : float or array
+            resonant frequency in Hz given by the fitted polynomial
+        """
+        if not self.fit_bool:
+            print("Error: Please run fit method before getting parameters!")
+            return -1
+        return self._trend(0, current)[0]
+
+    def get_f0_err(self, current = None):
+        """
+        Parameters
+        ----------
+        current : float or array
+            coil current (optional, currents of the resonances by default)
+
+        Returns
+        -------
+        f0_err : float or array
+            error of the resonant frequency in Hz (including correlations of the coefficients)
+        """
+        if not self.fit_bool:
+            print("Error: Please run fit method before getting parameters!")
+            return 0
+        return self._trend(0, current)[1]
+
+    def get_gamma(self, current = None):
+        """
+        Parameters
+        ----------
+        current : float or array
+            coil current (optional, currents of the resonances by default)
+
+        Returns
+        -------
+        gamma : float or array
+            resonance width in Hz given by the fitted polynomial
+        """
+        if not self.fit_bool:
+            print("Error: Please run fit method before getting parameters!")
+            return -1
+        return self._trend(1, current)[0]
+
+    def get_gamma_err(self, current = None):
+        """
+        Parameters
+        ----------
+        current : float or array
+            coil current (optional, currents of the resonances by default)
+
+        Returns
+        -------
+        gamma_err : float or array
+            error of the resonance width in Hz (including correlations of the coefficients)
+        """
+        if not self.fit_bool:
+            print("Error: Please run fit method before getting parameters!")
+            return 0
+        return self._trend(1, current)[1]
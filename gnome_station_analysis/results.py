@@ -0,0 +1,228 @@
+import os
+import uuid
+import socket
+import numpy as np
+from . import series
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+# columns of the result files
+COLUMNS = ["file_name", "current", "time", "model", "f_min", "f_max", "f0", "f0_err", "gamma", "gamma_err", "popt", "perr", "pcov"]
+
+def _schema():
+    return pa.schema([("file_name", pa.string()), ("current", pa.float64()), ("time", pa.float64()), ("model", pa.string()),
+                      ("f_min", pa.float64()), ("f_max", pa.float64()),
+                      ("f0", pa.float64()), ("f0_err", pa.float64()), ("gamma", pa.float64()), ("gamma_err", pa.float64()),
+                      ("popt", pa.list_(pa.float64())), ("perr", pa.list_(pa.float64())), ("pcov", pa.list_(pa.float64()))])
+
+def _check():
+    if pa is None:
+        raise ImportError("Results writer requires pyarrow package (pip install pyarrow).")
+
+class writer:
+    """Streams fit results to Parquet or Arrow IPC files.
+
+    Parameters
+    ----------
+    directory : string
+        directory of the results dataset
+    format : string
+        "parquet" or "ipc" (Arrow IPC / Feather v2) (optional)
+    row_group_size : int
+        number of results written at once as a single row group (optional)
+    start : array
+        [day, hh, mm, ss] - reference time for the times read from the file names (optional)
+
+    Notes
+    -----
+    Every writer writes its own part file in the directory (named after the host, the process and a random id),
+    so many processes (or nodes) may append to the same dataset at the same time. The part file gets its final name
+    in close method, until then it is hidden from read(). Full covariance matrix is saved row by row in pcov column.
+
+    Examples
+    --------
+
+    with writer("results/") as out: \n
+        for res in resonances: \n
+            out.add(res)
+
+    """
+
+    def __init__(self, directory, format = "parquet", row_group_size = 1000, start = np.array([0, 0, 0, 0])):
+        """Creates the writer (the part file is created with the first row group).
+
+        Parameters
+        ----------
+        directory : string
+            directory of the results dataset
+        format : string
+            "parquet" or "ipc" (optional)
+        row_group_size : int
+            number of results written at once (optional)
+        start : array
+            [day, hh, mm, ss] - reference time (optional)
+        """
+        _check()
+        if format not in ("parquet", "ipc"):
+            raise ValueError("Unknown format: " + str(format))
+        os.makedirs(directory, exist_ok = True)
+        name = "part-%s-%d-%s.%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8], "parquet" if format == "parquet" else "arrow")
+        self.path = os.path.join(directory, name)
+        self.tmp_path = os.path.join(directory, "." + name + ".tmp")
+        self.format = format
+        self.row_group_size = row_group_size
+        self.start = start
+        self.rows = {column: [] for column in COLUMNS}
+        self._writer = None
+        self._sink = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_row(self, file_name, current, time, model, f_min, f_max, popt, pcov):
+        """Adds single result.
+
+        Parameters
+        ----------
+        file_name : string
+        current : float
+        time : float
+            time of the measurement (for example from series.times_from_names())
+        model : string
+            name of the fitted function (for example "complex_lorentz_lin_back")
+        f_min, f_max : floats
+            frequency window of the fit in Hz
+        popt : array
+            fit parameters (f0 and gamma must be popt[0] and popt[2])
+        pcov : array
+            covariance matrix
+        """
+        popt = np.asarray(popt, dtype = float)
+        pcov = np.asarray(pcov, dtype = float)
+        perr = np.sqrt(np.diag(pcov))
+        values = [str(file_name), float(current), float(time), str(model), float(f_min), float(f_max),
+                  popt[0], perr[0], popt[2], perr[2], popt.tolist(), perr.tolist(), pcov.ravel().tolist()]
+        for column, value in zip(COLUMNS, values):
+            self.rows[column].append(value)
+        if len(self.rows["file_name"]) >= self.row_group_size:
+            self.flush()
+
+    def add(self, res, time = None):
+        """Adds result of the fitted resonance (or FID) object.
+
+        Parameters
+        ----------
+        res : resonance
+            fitted resonance object
+        time : float
+            time of the measurement (optional, read from the file name by default)
+        """
+        if not res.fit_bool:
+            print("Error: Please run fit method before saving results!")
+            return
+        if time is None:
+            time = series.times_from_names([res.file_name], start = self.start)[0]
+        self.add_row(res.file_name, res.get_current(), time, res.model.__name__, np.min(res.freq), np.max(res.freq), res.popt, res.pcov)
+
+    def add_batch(self, file_names, currents, popt, pcov, model = "complex_lorentz_lin_back", times = None, f_min = np.nan, f_max = np.nan):
+        """Adds results of batch.fit_files() or batch.fit_directory().
+
+        Parameters
+        ----------
+        file_names, currents, popt, pcov : arrays
+            results of the batch fit
+        model : string
+            name of the fitted function (optional)
+        times : array
+            times of the measurements (optional, read from the file names by default)
+        f_min, f_max : floats
+            frequency window of the fits (optional)
+        """
+        if times is None:
+            times = series.times_from_names(file_names, start = self.start)
+        for i in range(len(file_names)):
+            self.add_row(file_names[i], currents[i], times[i], model, f_min, f_max, popt[i], pcov[i])
+
+    def flush(self):
+        """Writes the buffered results as a single row group."""
+        if len(self.rows["file_name"]) == 0:
+            return
+        table = pa.table(self.rows, schema = _schema())
+        if self._writer is None:
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(self.tmp_path, _schema())
+            else:
+                self._sink = pa.OSFile(self.tmp_path, "wb")
+                self._writer = ipc.new_file(self._sink, _schema())
+        self._writer.write_table(table)
+        self.rows = {column: [] for column in COLUMNS}
+
+    def close(self):
+        """Writes remaining results and gives the part file its final name."""
+        self.flush()
+        if self._writer is None:
+            return
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        os.replace(self.tmp_path, self.path)
+        self._writer = None
+        self._sink = None
+
+# builds dataset expression from the list of conditions
+def _expression(conditions):
+    operators = {"==": "__eq__", "!=": "__ne__", "<": "__lt__", "<=": "__le__", ">": "__gt__", ">=": "__ge__"}
+    expression = None
+    for column, operator, value in conditions:
+        if operator == "in":
+            term = ds.field(column).isin(value)
+        else:
+            term = getattr(ds.field(column), operators[operator])(value)
+        expression = term if expression is None else expression & term
+    return expression
+
+# reads selected columns and rows of the results dataset
+def read(directory, columns = None, conditions = [], format = "parquet"):
+    """Reads results written by writer
+
+    Parameters
+    ----------
+    directory : string
+        directory of the results dataset
+    columns : list of strings
+        columns to read (optional, all columns by default)
+    conditions : list of tuples
+        [(column, operator, value), ...] - only rows fulfilling all conditions are read (optional) \n
+        operator is one of "==", "!=", "<", "<=", ">", ">=", "in"
+    format : string
+        "parquet" or "ipc" (optional)
+
+    Returns
+    -------
+    table : pyarrow.Table
+        results, use table.column(name).to_numpy() to get numpy arrays
+
+    Examples
+    --------
+
+    read("results/", columns = ["time", "f0", "f0_err"], conditions = [("time", ">=", 24), ("gamma_err", "<", 0.1)])
+
+    Notes
+    -----
+    Only the selected columns are read and the conditions are checked with row group statistics before reading,
+    so row groups that cannot fulfil them are skipped.
+
+    """
+    _check()
+    dataset = ds.dataset(directory, format = format)
+    filter = _expression(conditions) if len(conditions) else None
+    return dataset.to_table(columns = columns, filter = filter)
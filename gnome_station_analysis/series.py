@@ -0,0 +1,247 @@
+import os
+import re
+import numpy as np
+from .tools import time as gtime
+
+# returns times (in hours from start) of measurements read from the file names
+def times_from_names(file_names, start = np.array([0, 0, 0, 0])):
+    """Reads measurement times from the file names
+
+    Parameters
+    ----------
+    file_names : array of strings
+        table of file names
+    start : array
+        [day, hh, mm, ss] - reference time (optional)
+
+    Returns
+    -------
+    times : array of floats
+        time from the start in hours for each file (np.nan when the time could not be read)
+
+    Notes
+    -----
+    The function uses tools.time.get_time_from_start() for the base name of every file (directories may contain numbers too).
+    The time is np.nan when the base name holds fewer than 6 numbers.
+
+    """
+    times = []
+    for file_name in file_names:
+        name = os.path.basename(file_name)
+        # get_time() takes the 6th number from the end, with fewer numbers the index would wrap around
+        if len(re.findall(r'\d+', name)) < 6:
+            times.append(np.nan)
+        else:
+            times.append(gtime.get_time_from_start(name, start = start))
+    return np.array(times, dtype = float)
+
+# sums of weights, weighted values and counts in each occupied bin (np.add.reduceat over sorted bins)
+def bin_sums(bins, values, weights):
+    """Aggregates weighted values in bins
+
+    Parameters
+    ----------
+    bins : array of ints
+        bin index of each value
+    values : array of floats
+        values to aggregate
+    weights : array of floats
+        weight of each value (inverse variance)
+
+    Returns
+    -------
+    occupied, sum_w, sum_wx, counts : arrays
+        indices of the occupied bins, sum of weights, sum of weighted values and number of values in each occupied bin
+
+    """
+    order = np.argsort(bins, kind = "stable")
+    bins = bins[order]
+    values = values[order]
+    weights = weights[order]
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    sum_w = np.add.reduceat(weights, starts)
+    sum_wx = np.add.reduceat(weights*values, starts)
+    counts = np.diff(np.r_[starts, len(bins)])
+    return bins[starts], sum_w, sum_wx, counts
+
+class binned_series:
+    """Time series of a fit result (for example f0 or gamma) binned on a regular time grid.
+
+    Parameters
+    ----------
+    cadence : float
+        width of the time bin (in the same units as the times, hours for tools.time.get_time_from_start())
+    start : float
+        time of the beginning of the first bin (optional)
+
+    Notes
+    -----
+    Each bin holds the inverse-variance weighted mean of the values that fall into it.
+    New results may be added at any time with add method - only the running sums of the touched bins are updated.
+
+    """
+
+    def __init__(self, cadence, start = 0):
+        """Creates empty binned series.
+
+        Parameters
+        ----------
+        cadence : float
+            width of the time bin
+        start : float
+            time of the beginning of the first bin (optional)
+        """
+        self.cadence = cadence
+        self.start = start
+        self.first_bin = 0
+        self.sum_w = np.zeros(0)
+        self.sum_wx = np.zeros(0)
+        self.counts = np.zeros(0, dtype = int)
+        self.rejected = 0
+
+    # makes room for bins from lo to hi (inclusive)
+    def _extend(self, lo, hi):
+        if len(self.counts) == 0:
+            self.first_bin = lo
+            size = hi - lo + 1
+            self.sum_w = np.zeros(size)
+            self.sum_wx = np.zeros(size)
+            self.counts = np.zeros(size, dtype = int)
+            return
+        last_bin = self.first_bin + len(self.counts) - 1
+        pad_lo = max(self.first_bin - lo, 0)
+        pad_hi = max(hi - last_bin, 0)
+        if pad_lo or pad_hi:
+            self.sum_w = np.pad(self.sum_w, (pad_lo, pad_hi))
+            self.sum_wx = np.pad(self.sum_wx, (pad_lo, pad_hi))
+            self.counts = np.pad(self.counts, (pad_lo, pad_hi))
+            self.first_bin -= pad_lo
+
+    def add(self, times, values, errors):
+        """Adds new results to the series.
+
+        Parameters
+        ----------
+        times : float or array like
+            times of the results
+        values : float or array like
+            results (for example f0 values)
+        errors : float or array like
+            errors of the results (for example get_f0_err() values)
+
+        Notes
+        -----
+        Results with non-finite value, time or error (or error <= 0) are not binned, they are only counted in rejected attribute.
+
+        """
+        times = np.atleast_1d(np.asarray(times, dtype = float))
+        values = np.atleast_1d(np.asarray(values, dtype = float))
+        errors = np.atleast_1d(np.asarray(errors, dtype = float))
+        good = np.isfinite(times) * np.isfinite(values) * np.isfinite(errors) * (errors > 0)
+        self.rejected += int(np.sum(~good))
+        if not np.any(good):
+            return
+        bins = np.floor((times[good] - self.start)/self.cadence).astype(int)
+        occupied, sum_w, sum_wx, counts = bin_sums(bins, values[good], 1/errors[good]**2)
+        self._extend(occupied[0], occupied[-1])
+        inds = occupied - self.first_bin
+        self.sum_w[inds] += sum_w
+        self.sum_wx[inds] += sum_wx
+        self.counts[inds] += counts
+
+    def add_resonances(self, resonances, times, param = 0):
+        """Adds fit results of resonance objects to the series.
+
+        Parameters
+        ----------
+        resonances : list of resonance objects
+            fitted resonances
+        times : array like
+            time of each resonance
+        param : int
+            number of the fit parameter (0 for f0, 2 for gamma)
+
+        """
+        values = [res.get_param(param) for res in resonances]
+        errors = [res.get_err(param) for res in resonances]
+        self.add(times, values, errors)
+
+    def get_times(self):
+        """
+        Returns
+        -------
+        times : array
+            centres of the bins
+        """
+        bins = self.first_bin + np.arange(len(self.counts))
+        return self.start + (bins + 0.5)*self.cadence
+
+    def get_values(self):
+        """
+        Returns
+        -------
+        values : array
+            inverse-variance weighted mean in each bin (np.nan for empty bins)
+        """
+        values = np.full(len(self.counts), np.nan)
+        full = self.counts > 0
+        values[full] = self.sum_wx[full]/self.sum_w[full]
+        return values
+
+    def get_errors(self):
+        """
+        Returns
+        -------
+        errors : array
+            error of the weighted mean in each bin (np.nan for empty bins)
+        """
+        errors = np.full(len(self.counts), np.nan)
+        full = self.counts > 0
+        errors[full] = 1/np.sqrt(self.sum_w[full])
+        return errors
+
+    def get_counts(self):
+        """
+        Returns
+        -------
+        counts : array of ints
+            number of results in each bin
+        """
+        return self.counts.copy()
+
+    def get_gaps(self):
+        """Counts empty bins between the first and the last result.
+
+        Returns
+        -------
+        gaps : int
+            number of bins without any result
+        """
+        return int(np.sum(self.counts == 0))
+
+# returns binned f0 and gamma series for a list of fitted resonances
+def f0_gamma_series(resonances, times, cadence, start = 0):
+    """Bins f0 and gamma of fitted resonances on a regular time grid
+
+    Parameters
+    ----------
+    resonances : list of resonance objects
+        fitted resonances
+    times : array like
+        time of each resonance (for example from times_from_names())
+    cadence : float
+        width of the time bin
+    start : float
+        time of the beginning of the first bin (optional)
+
+    Returns
+    -------
+    f0_series, gamma_series : binned_series, binned_series
+        binned resonant frequency and resonance width
+
+    """
+    f0_series = binned_series(cadence, start = start)
+    gamma_series = binned_series(cadence, start = start)
+    f0_series.add_resonances(resonances, times, param = 0)
+    gamma_series.add_resonances(resonances, times, param = 2)
+    return f0_series, gamma_series
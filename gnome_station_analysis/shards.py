@@ -0,0 +1,198 @@
+import os
+import glob
+import json
+import zlib
+import argparse
+import numpy as np
+from . import read
+from . import batch
+from . import series
+
+# shard of the file, depends only on the file name (not on the other files or the machine)
+def shard_of(file_name, n_shards):
+    """
+    Returns
+    -------
+    shard : int
+        number of the shard of the given file (crc32 of the file name modulo n_shards)
+    """
+    return zlib.crc32(os.path.basename(file_name).encode()) % n_shards
+
+# writes manifest files of all shards
+def split(directory, n_shards, manifest_dir):
+    """Splits all measurement files of a directory into shards described by manifest files
+
+    Parameters
+    ----------
+    directory : string
+        path to a direcotry with a series of measurements (on the shared filesystem)
+    n_shards : int
+        number of shards
+    manifest_dir : string
+        directory for the manifests and the results of the shards
+
+    Returns
+    -------
+    manifests : list of strings
+        paths of the manifest files (shard_iiii_of_nnnn.json)
+
+    Notes
+    -----
+    Assignment of the files to the shards is deterministic (see shard_of()), so splitting the same directory again
+    gives the same shards and new files do not move the old ones to other shards.
+    Manifests and results of a previous split (shard_* files) in manifest_dir are removed first.
+
+    """
+    file_names, currents = read.all_names_currents(directory)
+    shards = np.array([shard_of(name, n_shards) for name in file_names], dtype = int)
+    os.makedirs(manifest_dir, exist_ok = True)
+    for old in glob.glob(os.path.join(manifest_dir, "shard_*")):
+        os.remove(old)
+    manifests = []
+    for shard in range(n_shards):
+        inds = np.flatnonzero(shards == shard)
+        manifest = {"shard": shard, "n_shards": n_shards, "directory": os.path.abspath(directory),
+                    "files": [os.path.abspath(name) for name in file_names[inds]], "currents": currents[inds].tolist()}
+        path = os.path.join(manifest_dir, "shard_%04d_of_%04d.json" % (shard, n_shards))
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent = 1)
+        manifests.append(path)
+    return manifests
+
+# returns the path of the result file of the manifest
+def result_path(manifest_path):
+    """
+    Returns
+    -------
+    path : string
+        path of the result file of the shard (manifest path with .npz extension)
+    """
+    return os.path.splitext(manifest_path)[0] + ".npz"
+
+# fits all files of the shard and saves the result file
+def run(manifest_path, linear_background = True, max_time = 5, processes = 1, start = np.array([0, 0, 0, 0])):
+    """Processes single shard
+
+    Parameters
+    ----------
+    manifest_path : string
+        path of the manifest file written by split()
+    linear_background : bool
+        when true complex lorentzian with linear background is fitted (optional)
+    max_time : float
+        maximal time in seconds spent on a single fit (optional)
+    processes : int
+        number of fitting processes on this node (optional)
+    start : array
+        [day, hh, mm, ss] - reference time for the times saved in the results (optional)
+
+    Returns
+    -------
+    path : string
+        path of the result file
+
+    Notes
+    -----
+    Fits are done with batch.fit_files(). The result file is written under a temporary name and renamed at the end,
+    so a shard that crashed never leaves a partial result.
+
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    file_names = np.array(manifest["files"])
+    popt, pcov = batch.fit_files(file_names, linear_background = linear_background, max_time = max_time, processes = processes)
+    path = result_path(manifest_path)
+    tmp_path = path + ".tmp%d" % os.getpid()
+    with open(tmp_path, "wb") as f:
+        np.savez(f, file_names = file_names, currents = np.array(manifest["currents"], dtype = float),
+                 times = series.times_from_names(file_names, start = start), popt = popt, pcov = pcov,
+                 shard = manifest["shard"], n_shards = manifest["n_shards"])
+    os.replace(tmp_path, path)
+    return path
+
+# validates and merges results of all shards
+def merge(manifest_dir, output = None):
+    """Merges results of all shards
+
+    Parameters
+    ----------
+    manifest_dir : string
+        directory with the manifests and the results of the shards
+    output : string
+        path of the merged .npz file (optional)
+
+    Returns
+    -------
+    file_names, currents, times, popt, pcov : arrays
+        merged results sorted by rising current and time
+
+    Notes
+    -----
+    RuntimeError is raised when any shard has no result, its result does not cover all files of its manifest
+    or a file is present in more than one shard.
+
+    """
+    manifests = sorted(glob.glob(os.path.join(manifest_dir, "shard_*_of_*.json")))
+    if len(manifests) == 0:
+        raise RuntimeError("There are no manifests in " + manifest_dir)
+    missing = []
+    results = []
+    n_shards = set()
+    for manifest_path in manifests:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        n_shards.add(manifest["n_shards"])
+        path = result_path(manifest_path)
+        if not os.path.exists(path):
+            missing.append(manifest["shard"])
+            continue
+        with np.load(path) as result:
+            result = dict(result)
+        if set(result["file_names"]) != set(manifest["files"]):
+            raise RuntimeError("Result of shard %d does not match its manifest." % manifest["shard"])
+        results.append(result)
+    if len(n_shards) != 1 or len(manifests) != list(n_shards)[0]:
+        raise RuntimeError("Manifests of different splits or missing manifests in " + manifest_dir)
+    if missing:
+        raise RuntimeError("Missing results of shards: " + str(missing))
+    file_names = np.concatenate([res["file_names"] for res in results])
+    currents = np.concatenate([res["currents"] for res in results])
+    times = np.concatenate([res["times"] for res in results])
+    popt = np.concatenate([res["popt"] for res in results])
+    pcov = np.concatenate([res["pcov"] for res in results])
+    if len(np.unique(file_names)) != len(file_names):
+        raise RuntimeError("Some files are present in more than one shard.")
+    inds = np.lexsort((file_names, times, currents))
+    file_names, currents, times, popt, pcov = file_names[inds], currents[inds], times[inds], popt[inds], pcov[inds]
+    if output is not None:
+        np.savez(output, file_names = file_names, currents = currents, times = times, popt = popt, pcov = pcov)
+    return file_names, currents, times, popt, pcov
+
+# command line interface: python -m gnome_station_analysis.shards split|run|merge ...
+def main(args = None):
+    parser = argparse.ArgumentParser(prog = "python -m gnome_station_analysis.shards", description = "Sharded batch fitting of measurement directories.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    split_parser = commands.add_parser("split", help = "write manifests of the shards")
+    split_parser.add_argument("directory")
+    split_parser.add_argument("n_shards", type = int)
+    split_parser.add_argument("manifest_dir")
+    run_parser = commands.add_parser("run", help = "process a single shard")
+    run_parser.add_argument("manifest")
+    run_parser.add_argument("--processes", type = int, default = 1)
+    run_parser.add_argument("--max-time", type = float, default = 5)
+    run_parser.add_argument("--no-background", action = "store_true")
+    merge_parser = commands.add_parser("merge", help = "validate and merge results of all shards")
+    merge_parser.add_argument("manifest_dir")
+    merge_parser.add_argument("output")
+    args = parser.parse_args(args)
+    if args.command == "split":
+        for path in split(args.directory, args.n_shards, args.manifest_dir):
+            print(path)
+    elif args.command == "run":
+        print(run(args.manifest, linear_background = not args.no_background, max_time = args.max_time, processes = args.processes))
+    else:
+        file_names = merge(args.manifest_dir, args.output)[0]
+        print("Merged %d results into %s" % (len(file_names), args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import sys
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+
+# unlinks all given segments (used by shared_arrays.close and at garbage collection)
+def _unlink_all(segments):
+    for shm in segments.values():
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    segments.clear()
+
+class shared_arrays:
+    """Owner of numpy arrays placed in shared memory.
+
+    Notes
+    -----
+    Arrays are copied once into shared memory segments with put method and only small descriptors
+    (name, shape, dtype) are sent to worker processes, which get the arrays without copying with attach().
+    All segments are freed when close method is called, at the end of with statement (also when a worker crashed
+    and the pool raised an exception) or when the object is garbage collected.
+
+    Examples
+    --------
+
+    with shared_arrays() as segments: \n
+        desc = segments.put(sig) \n
+        pool.submit(worker, desc)
+
+    """
+
+    def __init__(self):
+        self.segments = {}
+        self._finalizer = weakref.finalize(self, _unlink_all, self.segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def put(self, array):
+        """Copies the array into a new shared memory segment.
+
+        Parameters
+        ----------
+        array : array like
+
+        Returns
+        -------
+        descriptor : tuple
+            (name, shape, dtype) - to be passed to attach() in the worker process
+        """
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype = array.dtype, buffer = shm.buf)[...] = array
+        self.segments[shm.name] = shm
+        return (shm.name, array.shape, array.dtype.str)
+
+    def free(self, descriptor):
+        """Frees the segment of the given descriptor (when the worker finished using it).
+
+        Parameters
+        ----------
+        descriptor : tuple
+            descriptor returned by put method
+        """
+        shm = self.segments.pop(descriptor[0], None)
+        if shm is not None:
+            _unlink_all({descriptor[0]: shm})
+
+    def close(self):
+        """Frees all segments."""
+        _unlink_all(self.segments)
+
+class attach:
+    """Array in shared memory seen by the worker process (without copying).
+
+    Parameters
+    ----------
+    descriptor : tuple
+        descriptor returned by shared_arrays.put()
+
+    Notes
+    -----
+    The array is available as array attribute. Use it in with statement (or call close method),
+    the array and its views must not be kept after the end of the statement:
+
+    with attach(desc) as sig: \n
+        result = compute(sig.array)
+
+    """
+
+    def __init__(self, descriptor):
+        name, shape, dtype = descriptor
+        if sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name = name, track = False)
+        else:
+            self.shm = shared_memory.SharedMemory(name = name)
+        self.array = np.ndarray(shape, dtype = dtype, buffer = self.shm.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Detaches the array from the shared memory (the segment itself is freed by its owner)."""
+        self.array = None
+        self.shm.close()
@@ -17,6 +17,7 @@ name="gnome_station_analysis",
     download_url = "https://github.com/gregorylukasiewicz/gnome_station_analysis/archive/refs/tags/v_0.1.3.tar.gz",
     description="GNOME Station Analysis Tools",
     install_requires=["numpy", "matplotlib", "regex", "glob2", "scipy"],
+    extras_require={"numba": ["numba"], "parquet": ["pyarrow"]},
     long_description = long_description,
     long_description_content_type = "text/markdown"
 )
@@ -0,0 +1,25 @@
+import os
+import numpy as np
+from gnome_station_analysis import archive, read
+from test_batch import write_sweep
+
+def test_archive_matches_files(tmp_path):
+    os.makedirs(tmp_path / "sweep")
+    directory = write_sweep(tmp_path / "sweep", 5)
+    archive.pack(directory, str(tmp_path / "arch"), chunk_size = 2)
+    arch = archive.archive(str(tmp_path / "arch"), cache_entries = 1)
+    file_names, currents = read.all_names_currents(directory)
+    assert len(arch) == len(file_names)
+    for file_name, current in zip(file_names, currents):
+        np.testing.assert_array_equal(arch.data(file_name), np.loadtxt(file_name))
+        assert arch.currents[arch.index(file_name)] == current
+
+def test_repack_removes_old_chunks(tmp_path):
+    os.makedirs(tmp_path / "sweep")
+    directory = write_sweep(tmp_path / "sweep", 5)
+    archive.pack(directory, str(tmp_path / "arch"), chunk_size = 2)
+    for file_name in read.all_names_currents(directory)[0][2:]:
+        os.remove(file_name)
+    archive.pack(directory, str(tmp_path / "arch"), chunk_size = 2)
+    assert sorted(os.listdir(tmp_path / "arch")) == ["chunk_00000.npz", "index.npz"]
+    assert len(archive.archive(str(tmp_path / "arch"))) == 2
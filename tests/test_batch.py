@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from gnome_station_analysis import batch, shared, functions as func
+
+# writes a sweep of synthetic resonances with the file names read by read.current()
+def write_sweep(directory, n_files, seed = 0):
+    rng = np.random.default_rng(seed)
+    freq = np.linspace(950, 1050, 2000)
+    for i in range(n_files):
+        current = 10*i - 50
+        sig = func.complex_lorentz_lin_back(freq, 1000 + 0.5*current, 5, 3, 0.4, 1e-4, 0.01, -2e-4, 0.02)
+        sig = sig + 0.01*(rng.normal(size = len(freq)) + 1j*rng.normal(size = len(freq)))
+        np.savetxt(os.path.join(directory, "sweep_Curr_%d_uA.dat" % current), np.column_stack([freq, sig.real, sig.imag]))
+    return str(directory) + "/"
+
+# worker dying without any exception
+def _crash(descriptor):
+    with shared.attach(descriptor) as data:
+        os._exit(1)
+
+@pytest.mark.parametrize("transport", ["shared", "pickle"])
+def test_process_pool_matches_serial(tmp_path, transport):
+    directory = write_sweep(tmp_path, 17)
+    names_1, currents_1, popt_1, pcov_1 = batch.fit_directory(directory, processes = 1)
+    names_2, currents_2, popt_2, pcov_2 = batch.fit_directory(directory, processes = 2, transport = transport)
+    assert list(names_1) == list(names_2)
+    np.testing.assert_array_equal(currents_1, currents_2)
+    np.testing.assert_allclose(popt_2, popt_1, rtol = 1e-10)
+    np.testing.assert_allclose(pcov_2, pcov_1, rtol = 1e-8, atol = 1e-20)
+    assert np.all(np.isfinite(popt_1))
+
+def test_segments_freed_after_worker_crash():
+    with pytest.raises(BrokenProcessPool):
+        with ProcessPoolExecutor(max_workers = 1) as pool, shared.shared_arrays() as segments:
+            descriptor = segments.put(np.arange(1000.0))
+            pool.submit(_crash, descriptor).result()
+    with pytest.raises(FileNotFoundError):
+        shared.attach(descriptor)
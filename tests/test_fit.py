@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from scipy.optimize import curve_fit, least_squares
+from gnome_station_analysis import fit, functions as func
+
+def spectrum(phi, f0 = 1000, gamma = 3, seed = 0, freq = None):
+    rng = np.random.default_rng(seed)
+    if freq is None:
+        freq = np.linspace(950, 1050, 1000)
+    sig = func.complex_lorentz(freq, f0, 5, gamma, phi)
+    return freq, sig + 0.01*(rng.normal(size = len(freq)) + 1j*rng.normal(size = len(freq)))
+
+@pytest.mark.parametrize("linear_background", [True, False])
+@pytest.mark.parametrize("phi", [0.4, 0.0, 1.0, 3.0])
+def test_robust_clean_spectrum_default_strategy(phi, linear_background):
+    freq, sig = spectrum(phi)
+    popt, pcov, info = fit.robust(freq, sig, linear_background = linear_background)
+    assert info["strategy"] == "default"
+    assert abs(popt[0] - 1000) < 5*np.sqrt(pcov[0][0])
+    assert abs(popt[2] - 3) < 5*np.sqrt(pcov[2][2])
+
+# spectra on which the solver crosses gamma < 0 for many steps before converging (found by random search)
+@pytest.mark.parametrize("n, span, f0, gamma, phi, linear_background", [
+    (2698, 195.2, 955.7, 10.69, -0.57, True),
+    (2359, 95.7, 976.4, 13.24, -0.26, True),
+    (2788, 220.8, 1034.9, 16.33, 0.06, True),
+])
+def test_robust_recovers_from_negative_gamma(n, span, f0, gamma, phi, linear_background):
+    freq = np.linspace(1000 - span/2, 1000 + span/2, n)
+    rng = np.random.default_rng(1)
+    sig = func.complex_lorentz(freq, f0, 5*gamma/3, gamma, phi) + 0.01*(rng.normal(size = n) + 1j*rng.normal(size = n))
+    popt, pcov, info = fit.robust(freq, sig, linear_background = linear_background)
+    assert info["strategy"] is not None
+    assert ("default", "negative gamma") not in info["attempts"]
+    assert abs(popt[0] - f0) < gamma/10
+
+@pytest.mark.parametrize("seed", range(5))
+def test_robust_rejects_pure_noise(seed):
+    freq = np.linspace(950, 1050, 1000)
+    rng = np.random.default_rng(seed)
+    noise = 0.01*(rng.normal(size = len(freq)) + 1j*rng.normal(size = len(freq)))
+    popt, pcov, info = fit.robust(freq, noise)
+    assert info["strategy"] is None
+    assert np.all(np.isnan(popt))
+
+def test_robust_matches_curve_fit():
+    freq, sig = spectrum(0.4)
+    popt, pcov, info = fit.robust(freq, sig, linear_background = False)
+    popt_cf, pcov_cf = curve_fit(func.vec_model, freq, np.hstack([sig.real, sig.imag]), p0 = fit.guess_initial(freq, sig))
+    np.testing.assert_allclose(popt, popt_cf, rtol = 1e-6, atol = 1e-6)
+
+def test_multi_peak_fit_matches_exact_jacobian():
+    rng = np.random.default_rng(0)
+    freq = np.linspace(900, 1100, 20000)
+    params = [950, 5, 2, 0.3, 1000, 3, 3, 1.0, 1050, 4, 1.5, -0.5, 1e-4, 0.01, -1e-4, 0.02]
+    sig = func.complex_lorentz_multi(freq, *params) + 0.01*(rng.normal(size = len(freq)) + 1j*rng.normal(size = len(freq)))
+    popt, pcov = fit.complex_lorentz_multi(freq, sig, n_peaks = 3)
+    sig_vector = np.hstack([sig.real, sig.imag])
+    exact = least_squares(lambda p: func.vec_model_multi(freq, *p) - sig_vector, popt,
+                          jac = lambda p: fit.jac_multi(freq, p, window = np.inf).toarray(), method = "lm")
+    pcov_exact = fit.covariance(fit.jac_multi(freq, exact.x, window = np.inf).toarray(), exact.fun)
+    err = np.sqrt(np.diag(pcov_exact))
+    assert np.all(np.abs(popt - exact.x) < 1e-2*err)
+    np.testing.assert_allclose(np.sqrt(np.diag(pcov)), err, rtol = 5e-3)
+
+def test_bootstrap_matches_curve_fit_refits():
+    freq, sig = spectrum(0.4)
+    x = np.hstack([freq, freq])
+    vec = lambda x, *p: np.hstack([func.complex_lorentz(freq, *p).real, func.complex_lorentz(freq, *p).imag])
+    popt, pcov = curve_fit(vec, x, np.hstack([sig.real, sig.imag]), p0 = [1000, 5, 3, 0.4])
+    err = np.sqrt(np.diag(pcov))
+    samples, ci = fit.bootstrap(func.complex_lorentz, freq, sig, popt, n_boot = 20, seed = 0)
+    resid = sig - func.complex_lorentz(freq, *popt)
+    inds = np.random.default_rng(0).integers(0, len(freq), (20, len(freq)))
+    for sample, ind in zip(samples, inds):
+        resampled = func.complex_lorentz(freq, *popt) + resid[ind]
+        exact, _ = curve_fit(vec, x, np.hstack([resampled.real, resampled.imag]), p0 = popt)
+        assert np.all(np.abs(sample - exact) < 0.05*err)
+
+def test_jackknife_errors_match_covariance():
+    freq, sig = spectrum(0.4, freq = np.linspace(950, 1050, 4000))
+    x = np.hstack([freq, freq])
+    vec = lambda x, *p: np.hstack([func.complex_lorentz(freq, *p).real, func.complex_lorentz(freq, *p).imag])
+    popt, pcov = curve_fit(vec, x, np.hstack([sig.real, sig.imag]), p0 = [1000, 5, 3, 0.4])
+    samples, ci = fit.bootstrap(func.complex_lorentz, freq, sig, popt, method = "jackknife", n_blocks = 50)
+    ratio = (ci[1] - ci[0])/2/np.sqrt(np.diag(pcov))
+    assert np.all((ratio > 0.7) & (ratio < 1.3))
+
+# averaged wing points weighted with their counts carry the information of the original points
+def test_decimated_crop_weighted_fit():
+    freq, sig = spectrum(0.4, freq = np.linspace(900, 1100, 8000))
+    popt, pcov = fit.complex_lorentz(freq, sig)
+    freq_c, sig_c, counts, crop = fit.crop(freq, sig, width = 30, core = 3, decimate = 20)
+    assert np.sum(counts) == np.count_nonzero((freq >= crop["f_min"]) & (freq <= crop["f_max"]))
+    popt_c, pcov_c = fit.complex_lorentz(freq_c, sig_c, sigma = 1/np.sqrt(counts))
+    np.testing.assert_allclose(np.sqrt(np.diag(pcov_c)), np.sqrt(np.diag(pcov)), rtol = 0.05)
+    assert np.all(np.abs(popt_c - popt) < 2*np.sqrt(np.diag(pcov)))
+    popt_r, pcov_r, info = fit.robust(freq_c, sig_c, linear_background = False, sigma = 1/np.sqrt(counts))
+    np.testing.assert_allclose(popt_r, popt_c, rtol = 1e-6)
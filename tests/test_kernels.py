@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from gnome_station_analysis import kernels, fit, gap, read, functions as func
+
+pytest.importorskip("numba")
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    size = 10000
+    freq = np.sort(rng.uniform(0, 2000, size))
+    params = np.array([1000, 2, 5, 0.3, 1e-4, 0.01, -2e-4, 0.02])
+    return {"freq": freq, "params": params,
+            "sig_vector": func.vec_model_lin_back(freq, *params) + rng.normal(0, 1e-3, 2*size),
+            "fft": rng.normal(size = size) + 1j*rng.normal(size = size),
+            "time_sig": rng.normal(size = size)}
+
+# runs compute() with both backends
+def both_backends(compute):
+    previous = kernels.get_backend()
+    try:
+        kernels.set_backend("numpy")
+        reference = compute()
+        kernels.set_backend("numba")
+        compiled = compute()
+    finally:
+        kernels.set_backend(previous)
+    return reference, compiled
+
+def assert_parity(reference, compiled, rtol = 1e-12):
+    reference = np.asarray(reference)
+    compiled = np.asarray(compiled)
+    assert compiled.shape == reference.shape
+    assert np.max(np.abs(compiled - reference)) <= rtol*np.max(np.abs(reference))
+
+@pytest.mark.parametrize("n_params", [4, 8])
+def test_residual_jac(data, n_params):
+    reference, compiled = both_backends(lambda: kernels.residual_jac(data["freq"], data["sig_vector"], data["params"][:n_params]))
+    assert_parity(reference[0], compiled[0])
+    assert_parity(reference[1], compiled[1])
+
+def test_band(data):
+    reference, compiled = both_backends(lambda: kernels.band(data["freq"], data["fft"], 500, 1500))
+    np.testing.assert_array_equal(reference[0], compiled[0])
+    np.testing.assert_array_equal(reference[1], compiled[1])
+
+def test_window_means(data):
+    windows = [(0.3, 0.5), (0.8, 1.0), (0, 1)]
+    assert_parity(*both_backends(lambda: kernels.cumulative(data["time_sig"])))
+    assert_parity(*both_backends(lambda: kernels.window_means(kernels.cumulative(data["time_sig"]), windows)))
+    assert_parity(*both_backends(lambda: gap.gap(data["time_sig"])))
+
+# file_gap goes through the same kernels as gap
+def test_file_gap(data, tmp_path):
+    file_name = str(tmp_path / "step.dat")
+    np.savetxt(file_name, np.column_stack([np.arange(len(data["time_sig"])), data["time_sig"]]))
+    reference, compiled = both_backends(lambda: gap.file_gap(file_name))
+    assert_parity(reference, compiled)
+    assert_parity(reference, gap.gap(np.loadtxt(file_name, usecols = 1)))
+
+def test_comp_fft(data):
+    time = np.arange(len(data["time_sig"]))*1e-3
+    reference, compiled = both_backends(lambda: read.comp_fft(time, data["time_sig"], fmin = 100, fmax = 300))
+    np.testing.assert_array_equal(reference[0], compiled[0])
+    np.testing.assert_array_equal(reference[1], compiled[1])
+
+# numba backend fits with fit.fused() (least_squares with analytic jacobian) instead of curve_fit
+@pytest.mark.parametrize("fit_function, n_params", [(fit.complex_lorentz, 4), (fit.complex_lorentz_lin_back, 8)])
+@pytest.mark.parametrize("phi", [0.0, 0.4, 2.0])
+def test_fit_parity(fit_function, n_params, phi):
+    rng = np.random.default_rng(1)
+    freq = np.linspace(950, 1050, 2000)
+    sig = func.complex_lorentz(freq, 1000, 5, 3, phi) + 0.01*(rng.normal(size = len(freq)) + 1j*rng.normal(size = len(freq)))
+    reference, compiled = both_backends(lambda: fit_function(freq, sig))
+    err = np.sqrt(np.diag(reference[1]))
+    assert len(compiled[0]) == n_params
+    assert np.all(np.abs(compiled[0] - reference[0]) < 1e-3*err)
+    np.testing.assert_allclose(np.sqrt(np.diag(compiled[1])), err, rtol = 1e-4)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from gnome_station_analysis import fit, precision, read, functions as func
+
+@pytest.fixture
+def single():
+    precision.set_precision("single")
+    yield
+    precision.set_precision("double")
+
+def spectrum(centre, linear_background, n = 20000, seed = 0):
+    rng = np.random.default_rng(seed)
+    freq = np.linspace(centre - 50, centre + 50, n)
+    sig = func.complex_lorentz(freq, centre + 1.3, 5, 3, 0.4)
+    if linear_background:
+        sig = sig + 1e-4*(freq - centre) + 0.02j
+    return freq, sig + 0.01*(rng.normal(size = n) + 1j*rng.normal(size = n))
+
+# f0 and gamma of the single precision fits differ from the double precision ones by a small fraction of their errors
+@pytest.mark.parametrize("linear_background", [True, False])
+@pytest.mark.parametrize("centre", [1e3, 1e5, 1e6])
+def test_single_precision_f0_gamma_impact(centre, linear_background):
+    freq, sig = spectrum(centre, linear_background)
+    result = precision.compare(freq, sig, linear_background = linear_background, repeat = 1)
+    assert abs(result["f0_shift"]) < 0.05
+    assert abs(result["gamma_shift"]) < 0.05
+
+# f0 resolution of the single precision fit does not depend on the carrier frequency
+@pytest.mark.parametrize("centre", [1e6, 1e8])
+def test_single_precision_high_frequency(centre, single):
+    freq, sig = spectrum(centre, True)
+    popt, pcov = fit.complex_lorentz_lin_back(freq, sig.astype(np.complex64))
+    err = np.sqrt(np.diag(pcov))
+    assert abs(popt[0] - (centre + 1.3)) < 3*err[0]
+    assert abs(popt[2] - 3) < 3*err[2]
+    assert err[0] < 2e-3
+
+@pytest.mark.parametrize("fit_function", [fit.complex_lorentz, fit.complex_lorentz_doubleside,
+                                          fit.complex_lorentz_lin_back, fit.complex_lorentz_doubleside_lin_back])
+def test_single_precision_errors_match_double(fit_function, single):
+    freq, sig = spectrum(1e3, False)
+    popt_single, pcov_single = fit_function(freq, sig.astype(np.complex64))
+    precision.set_precision("double")
+    popt_double, pcov_double = fit_function(freq, sig)
+    err = np.sqrt(np.diag(pcov_double))
+    assert pcov_single.dtype == np.float64
+    np.testing.assert_allclose(np.sqrt(np.diag(pcov_single))[:4], err[:4], rtol = 1e-3)
+    assert np.all(np.abs(popt_single - popt_double)[:4] < 0.05*err[:4])
+
+def test_scales_stay_double(tmp_path, single):
+    time_scale = 1e5 + np.arange(4096)*1e-3
+    name = str(tmp_path / "fid.dat")
+    np.savetxt(name, np.column_stack([time_scale, np.sin(2*np.pi*100*time_scale)]))
+    t, sig = read.file(name, 0, 1)
+    assert t.dtype == np.float64 and sig.dtype == np.float32
+    np.testing.assert_array_equal(t, np.loadtxt(name)[:, 0])
+    np.testing.assert_array_equal(sig, np.loadtxt(name)[:, 1].astype(np.float32))
+    sig_2, t_2, sig_3 = read.file(name, 1, 0, 1)
+    np.testing.assert_array_equal(t_2, t)
+    np.testing.assert_array_equal(sig_3, sig)
+    chunks = list(read.file_chunks(name, 1000, 0, 1))
+    assert chunks[0][0].dtype == np.float64 and chunks[0][1].dtype == np.float32
+    freq, fft = read.comp_fft(t, sig)
+    assert freq.dtype == np.float64 and fft.dtype == np.complex64
+
+# benchmark of memory and fit throughput (run with pytest -s to see the numbers)
+@pytest.mark.parametrize("linear_background", [True, False])
+def test_benchmark_single_precision(linear_background):
+    freq, sig = spectrum(1e6, linear_background, n = 100000)
+    result = precision.compare(freq, sig, linear_background = linear_background, repeat = 3)
+    print("\nlinear_background = %s: double %.1f ms, %d B; single %.1f ms, %d B" % (linear_background,
+          1e3*result["time_double"], result["bytes_double"], 1e3*result["time_single"], result["bytes_single"]))
+    # the signal takes half of the memory, the frequency scale stays float64
+    assert result["bytes_single"] == freq.nbytes + sig.nbytes//2
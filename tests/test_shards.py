@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+import pytest
+from gnome_station_analysis import shards, batch
+from test_batch import write_sweep
+
+# directory with a sweep split into shards
+@pytest.fixture
+def split(tmp_path):
+    os.makedirs(tmp_path / "sweep")
+    directory = write_sweep(tmp_path / "sweep", 9)
+    manifest_dir = str(tmp_path / "shards")
+    return directory, manifest_dir, shards.split(directory, 3, manifest_dir)
+
+def run_shards(manifests):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH = root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    runs = [subprocess.Popen([sys.executable, "-m", "gnome_station_analysis.shards", "run", path], env = env, stdout = subprocess.PIPE)
+            for path in manifests]
+    for process in runs:
+        process.communicate()
+        assert process.returncode == 0
+
+def test_concurrent_shards_match_single_run(split):
+    directory, manifest_dir, manifests = split
+    run_shards(manifests)
+    file_names, currents, times, popt, pcov = shards.merge(manifest_dir)
+    names_ref, currents_ref, popt_ref, pcov_ref = batch.fit_directory(directory)
+    assert sorted(file_names) == sorted(os.path.abspath(name) for name in names_ref)
+    np.testing.assert_array_equal(currents, currents_ref)
+    np.testing.assert_allclose(popt, popt_ref)
+
+def test_merge_fails_on_missing_result(split):
+    directory, manifest_dir, manifests = split
+    run_shards(manifests[1:])
+    with pytest.raises(RuntimeError, match = "Missing results"):
+        shards.merge(manifest_dir)
+
+def test_split_removes_previous_shards(split):
+    directory, manifest_dir, manifests = split
+    run_shards(manifests)
+    manifests = shards.split(directory, 2, manifest_dir)
+    assert sorted(os.listdir(manifest_dir)) == sorted(os.path.basename(path) for path in manifests)
+    files = sum([json.load(open(path))["files"] for path in manifests], [])
+    assert len(files) == len(set(files)) == 9